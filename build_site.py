@@ -10,13 +10,22 @@ Vstupy (co existuje, to se zobrazí):
   - nrp_dump/top10_datasets_enriched_v2.md    – TOP 10 datasetů
 
 Grafy (PNG) se kopírují do public/ a odkazují se relativně.
+
+Interaktivní grafy: z nrp_dump/nrp.duckdb se do public/data/ vypíšou malé
+předagregované JSON soubory (velikost nezávisí na počtu záznamů, jen na počtu
+komunit, čtvrtletí a košů velikostí) a site/charts.js z nich v prohlížeči kreslí
+SVG s filtrem komunity, časového koše a rozsahu velikostí. Statické PNG zůstávají
+jako záloha (bez JavaScriptu nebo když se data nenačtou).
 """
 import datetime
+import json
 import pathlib
 import shutil
 
 import markdown
 
+import nrp_db
+
 # Barvy EOSC
 EOSC_GREEN = "#008691"   # Lively Green
 EOSC_PINK  = "#FF5C80"   # Mild Pink
@@ -32,6 +41,81 @@ CHARTS = [
 ]
 QUARTER_CHART = ("records_by_quarter.png", "Records by publication quarter")
 
+SITE_JS = ROOT / "site" / "charts.js"
+# koše velikostí pro interaktivní histogram: BINS_PER_UNIT košů na každý násobek 1024
+BINS_PER_UNIT = 8
+CDF_POINTS = 101
+TOP_N = 10
+
+
+def _write_json(path: pathlib.Path, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_data(out_dir: pathlib.Path) -> bool:
+    """
+    Zapíše cells.json, cdf.json a top.json (TOP_N v každé jednotce velikosti) pro site/charts.js; False, pokud
+    databázi nejde sestavit (chybí records_flat.parquet).
+    """
+    try:
+        con = nrp_db.get_connection(DUMP)
+    except FileNotFoundError as e:
+        print(f"[!] No data for interactive charts ({e})")
+        return False
+    out_dir.mkdir(exist_ok=True)
+    cols = set(nrp_db.columns(con, "records_flat"))
+    opt = lambda c: c if c in cols else "NULL"
+    base = f"""
+        SELECT {"coalesce(community, '')" if "community" in cols else "''"} AS c, id,
+               {opt("title")} AS title, {opt("publication_year")} AS year, {opt("url")} AS url,
+               {nrp_db.PUB_TS} AS ts, {nrp_db.BYTES} AS b
+        FROM records_flat
+    """
+
+    # krychle (komunita × čtvrtletí publikace × koš velikosti) → počet a součet velikostí;
+    # čtvrtletí = rok * 4 + (Q − 1), koš -1 = nulová velikost, null = neznámá
+    rows = con.execute(f"""
+        SELECT c, CASE WHEN ts IS NOT NULL THEN year(ts) * 4 + quarter(ts) - 1 END AS q,
+               CASE WHEN b > 0 THEN floor(log2(b) / 10 * {BINS_PER_UNIT})::INTEGER WHEN b = 0 THEN -1 END AS bin,
+               count(*) AS n, coalesce(sum(b), 0) AS bytes
+        FROM ({base}) GROUP BY ALL ORDER BY ALL
+    """).fetchall()
+    communities = sorted({r[0] for r in rows})
+    index = {c: i for i, c in enumerate(communities)}
+    _write_json(out_dir / "cells.json", {
+        "bins_per_unit": BINS_PER_UNIT, "communities": communities,
+        "cells": [[index[c], q, b, n, int(t)] for c, q, b, n, t in rows],
+    })
+
+    fractions = [i / (CDF_POINTS - 1) for i in range(CDF_POINTS)]
+    cdf = con.execute(f"""
+        SELECT CASE WHEN GROUPING(c) = 1 THEN '*' ELSE c END, quantile_cont(b::DOUBLE, {fractions})
+        FROM ({base}) WHERE b > 0
+        GROUP BY GROUPING SETS ((), (c))
+    """).fetchall()
+    _write_json(out_dir / "cdf.json", {
+        key: [[f, round(v)] for f, v in zip(fractions, qs)] for key, qs in sorted(cdf) if qs is not None
+    })
+
+    # TOP_N pro každou jednotku velikosti (B, KB, …; nuly zvlášť), ať má prohlížeč
+    # nejvyšší záznamy i pro zúžený rozsah velikostí; celkové TOP_N je v jejich sjednocení
+    top = con.execute(f"""
+        WITH s AS (SELECT *, CASE WHEN b > 0 THEN floor(log2(b) / 10)::INTEGER ELSE -1 END AS unit
+                   FROM ({base}) WHERE b IS NOT NULL)
+        SELECT '*' AS k, id, title, b, year, url FROM s
+        QUALIFY row_number() OVER (PARTITION BY unit ORDER BY b DESC, id) <= {TOP_N}
+        UNION ALL
+        SELECT c, id, title, b, year, url FROM s
+        QUALIFY row_number() OVER (PARTITION BY c, unit ORDER BY b DESC, id) <= {TOP_N}
+        ORDER BY k, b DESC, id
+    """).fetchall()
+    out = {}
+    for k, rid, title, b, year, url in top:
+        out.setdefault(k, []).append([rid, title, b, year, url])
+    _write_json(out_dir / "top.json", out)
+    return True
+
 
 def md_to_html(path: pathlib.Path, demote: int = 0) -> str:
     if not path.exists():
@@ -62,8 +146,33 @@ def section(title: str, body: str) -> str:
     return f'<section><h2>{title}</h2>{body}</section>'
 
 
+def explorer() -> str:
+    return """<section id="explorer" class="explorer" data-src="data/" hidden>
+      <h2>Interactive charts</h2>
+      <div class="controls">
+        <label>Community <select name="community"><option value="*">All communities</option></select></label>
+        <label>Time bucket <select name="bucket"><option value="quarter">Quarter</option><option value="year">Year</option></select></label>
+        <label>Size from <select name="lo"></select></label>
+        <label>to <select name="hi"></select></label>
+      </div>
+      <p class="meta summary"></p>
+      <div class="charts">
+        <figure class="chart"><div class="hist"></div><figcaption>Distribution of dataset sizes</figcaption></figure>
+        <figure class="chart"><div class="cdf"></div><figcaption>Cumulative distribution of sizes</figcaption></figure>
+        <figure class="chart"><div class="time"></div><figcaption>Records by publication date</figcaption></figure>
+      </div>
+      <div class="tablewrap top">
+        <table><thead><tr><th>#</th><th>Largest datasets in selection</th><th>Size</th><th>Year</th></tr></thead>
+        <tbody></tbody></table>
+      </div>
+    </section>"""
+
+
 def main() -> None:
     OUT.mkdir(exist_ok=True)
+    interactive = SITE_JS.exists() and export_data(OUT / "data")
+    if interactive:
+        shutil.copyfile(SITE_JS, OUT / "charts.js")
 
     # zkopíruj dostupné grafy do public/
     for name, _ in CHARTS + [QUARTER_CHART]:
@@ -80,22 +189,37 @@ def main() -> None:
 
     now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
-    parts = [
-        section("Communities and records", communities),
-        section("Dataset sizes",
-                (f'<div class="charts">{size_figs}</div>' if size_figs else "") + size_stats),
-        section("Records by publication quarter", quarter_fig),
-        section("Top 10 largest datasets",
-                f'<div class="tablewrap">{top10}</div>' if top10 else ""),
-    ]
+    if interactive:
+        # PNG jen jako záloha: s JavaScriptem je skryje třída "js" (a lazy obrázky se nestahují)
+        static = size_figs + quarter_fig
+        parts = [
+            section("Communities and records", communities),
+            explorer(),
+            f'<div class="static-charts">{section("Charts", f"<div class=charts>{static}</div>")}</div>'
+            if static else "",
+            section("Dataset sizes", size_stats),
+        ]
+    else:
+        parts = [
+            section("Communities and records", communities),
+            section("Dataset sizes",
+                    (f'<div class="charts">{size_figs}</div>' if size_figs else "") + size_stats),
+            section("Records by publication quarter", quarter_fig),
+        ]
+    parts.append(section("Top 10 largest datasets",
+                         f'<div class="tablewrap">{top10}</div>' if top10 else ""))
     body = "\n".join(p for p in parts if p)
 
+    head_js = ('<script>document.documentElement.classList.add("js")</script>\n'
+               '  <script src="charts.js" defer></script>') if interactive else ""
+
     html_out = f"""<!doctype html>
 <html lang="cs">
 <head>
   <meta charset="utf-8">
   <meta name="viewport" content="width=device-width, initial-scale=1">
   <title>Catch-all Repository report</title>
+  {head_js}
   <style>
     :root {{
       --green: {EOSC_GREEN}; --pink: {EOSC_PINK}; --grey: {EOSC_GREY};
@@ -133,6 +257,18 @@ def main() -> None:
       border-radius:12px;padding:.75rem}}
     figure.chart img{{width:100%;height:auto;display:block}}
     figure.chart figcaption{{color:#374151;font-size:.85rem;margin-top:.4rem;text-align:center}}
+    .js .static-charts{{display:none}}
+    .explorer .controls{{display:flex;flex-wrap:wrap;gap:.5rem 1.25rem;margin-bottom:.5rem}}
+    .explorer select{{margin-left:.35rem;font:inherit;padding:.2rem .35rem;border-radius:6px;
+      border:1px solid var(--grey);background:var(--bg);color:var(--fg)}}
+    .explorer svg{{width:100%;height:auto;display:block}}
+    .explorer .bar{{fill:var(--green)}}
+    .explorer .line{{fill:none;stroke:var(--green);stroke-width:2}}
+    .explorer .median{{stroke:var(--pink);stroke-width:2;stroke-dasharray:6 4}}
+    .explorer .median-label{{fill:var(--pink);font-size:11px}}
+    .explorer .grid{{stroke:var(--grey);stroke-dasharray:4 3}}
+    .explorer .axis{{stroke:#1f2937}}
+    .explorer .tick{{fill:#1f2937;font-size:11px}}
     .footer{{margin-top:2.5rem;color:var(--muted);font-size:.9rem;
       border-top:1px solid var(--border);padding-top:1rem}}
   </style>
@@ -1,16 +1,56 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import requests, json, re, sys, datetime
+import argparse, functools, heapq, json, os, re, sys, datetime, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from urllib.parse import urljoin, urlencode
 
-BASE = "https://datarepo.eosc.cz"
+import pandas as pd
+import requests
+
+from nrp_http import default_cache, get_session, polite_get
+from raw_store import RawStore
+
+BASE = os.getenv("NRP_BASE_URL", "https://datarepo.eosc.cz").rstrip("/")
 COMMUNITIES_URL = f"{BASE}/api/communities"
+COMMUNITIES_PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+# poslední známý výpis komunit (slug, id, název) – záloha, když API neodpoví
+COMMUNITIES_SNAPSHOT = Path("nrp_dump") / "communities.json"
+
+# session (a cache odpovědí) vznikají až při prvním dotazu – import z report.py nic neotevírá
+_session = None
+_pool_size = DEFAULT_CONCURRENCY
+_session_lock = threading.Lock()
 
-S = requests.Session()
-S.headers.update({
-    "Accept": "application/json",
-    "User-Agent": "nrp-community-scan/1.1"
-})
+@functools.lru_cache(maxsize=None)
+def _response_cache():
+    return default_cache()
+
+def session():
+    """Session sdílená vlákny skenu → pool spojení aspoň tak velký jako paralelismus."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = get_session(pool_size=max(_pool_size, 1), cache=_response_cache())
+            _session.headers.update({
+                "Accept": "application/json",
+                "User-Agent": "nrp-community-scan/1.1"
+            })
+        return _session
+
+def use_concurrency(concurrency):
+    """
+    Pool sdílené session aspoň na `concurrency` (jinak urllib3 spojení nad limit zahazuje);
+    menší už otevřená session se zavře a při dalším dotazu vznikne nová.
+    """
+    global _session, _pool_size
+    with _session_lock:
+        if concurrency > _pool_size:
+            _pool_size = concurrency
+            if _session is not None:
+                _session.close()
+                _session = None
 
 def parse_dt(s):
     if not s: return None
@@ -28,8 +68,7 @@ def parse_dt(s):
         return None
 
 def safe_get_json(url):
-    r = S.get(url, timeout=45)
-    r.raise_for_status()
+    r = polite_get(session(), url, timeout=45)
     try:
         return r.json()
     except ValueError:
@@ -39,28 +78,42 @@ def safe_get_json(url):
         raise
 
 def collect_community_ids():
-    data = safe_get_json(COMMUNITIES_URL)
-    ids, titles = [], {}
-    def add(slug, title=""):
+    """
+    Projde všechny stránky výpisu komunit (links.next) a vrátí
+    (slugy v pořadí výpisu, {slug: název}, {id komunity (UUID): slug}).
+    """
+    ids, titles, aliases = [], {}, {}
+    def add(it):
+        slug = it.get("slug") or it.get("id") or it.get("identifier") or it.get("code") or it.get("name")
+        title = (it.get("metadata") or {}).get("title") or it.get("title") or it.get("name") or ""
         if slug and slug not in ids:
             ids.append(slug)
             titles[slug] = title or titles.get(slug, "")
-    if isinstance(data, list):
-        for it in data:
-            add(it.get("slug") or it.get("id") or it.get("identifier") or it.get("code") or it.get("name"),
-                (it.get("metadata") or {}).get("title") or it.get("title") or it.get("name") or "")
-    elif isinstance(data, dict):
-        for key in ("communities","items","hits","results","data"):
-            seq = data.get(key)
-            if isinstance(seq, list):
-                for it in seq:
-                    add(it.get("slug") or it.get("id") or it.get("identifier") or it.get("code") or it.get("name"),
-                        ((it.get("metadata") or {}).get("title") or it.get("title") or it.get("name") or ""))
-        if isinstance(data.get("hits"), dict):
-            for it in data["hits"].get("hits") or []:
-                add(it.get("slug") or it.get("id") or it.get("identifier") or it.get("code") or it.get("name"),
-                    ((it.get("metadata") or {}).get("title") or it.get("title") or it.get("name") or ""))
-    return ids, titles
+        # záznamy odkazují na komunity přes UUID (parent.communities.ids)
+        if slug and isinstance(it.get("id"), str):
+            aliases[it["id"]] = slug
+    url = f"{COMMUNITIES_URL}?{urlencode({'size': COMMUNITIES_PAGE_SIZE})}"
+    seen_urls = set()
+    while url and url not in seen_urls:
+        seen_urls.add(url)
+        data = safe_get_json(url)
+        before = len(aliases), len(ids)
+        if isinstance(data, list):
+            for it in data:
+                add(it)
+        elif isinstance(data, dict):
+            for key in ("communities","items","hits","results","data"):
+                seq = data.get(key)
+                if isinstance(seq, list):
+                    for it in seq:
+                        add(it)
+            if isinstance(data.get("hits"), dict):
+                for it in data["hits"].get("hits") or []:
+                    add(it)
+        next_url = (data.get("links") or {}).get("next") if isinstance(data, dict) else None
+        # prázdná stránka (nebo samé duplicity) = konec, i kdyby API dál posílalo links.next
+        url = next_url if (len(aliases), len(ids)) != before else None
+    return ids, titles, aliases
 
 def normalize_hits(data):
     """Vrátí list záznamů + total, tolerantně ke struktuře."""
@@ -98,25 +151,30 @@ def record_link(r):
         return f"{BASE}/datasets/records/{rid}"
     return None
 
-def _newest_links_from_url(url):
-    """Z daného search URL vrátí (total, [markdown odkazy na 5 nejnovějších])."""
-    data = safe_get_json(url)
-    hits, total = normalize_hits(data)
-
-    # server-side sort nemusí být spolehlivý → seřaď i klientsky
-    def key_dt(r):
-        return parse_dt(record_updated(r)) or datetime.datetime.min
-    hits_sorted = sorted(hits, key=key_dt, reverse=True)[:5] if hits else []
+def _updated_key(r):
+    dt = parse_dt(record_updated(r))
+    if dt is None:
+        return datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+    # naivní časy bereme jako UTC, ať jdou porovnat s ostatními
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
 
+def _markdown_links(hits):
     links = []
-    for r in hits_sorted:
+    for r in hits:
         rid = record_id(r)
         href = record_link(r)
         if rid and href:
             links.append(f"[{rid}]({href})")
         elif rid:
             links.append(rid)
-    return total, links
+    return links
+
+def _newest_links_from_url(url):
+    """Z daného search URL vrátí (total, [markdown odkazy na 5 nejnovějších])."""
+    data = safe_get_json(url)
+    hits, total = normalize_hits(data)
+    # server-side sort nemusí být spolehlivý → seřaď i klientsky
+    return total, _markdown_links(heapq.nlargest(5, hits, key=_updated_key))
 
 def fetch_5_newest_links(cid):
     url = f"{BASE}/api/communities/{cid}/records?{urlencode({'sort':'newest'})}"
@@ -129,14 +187,248 @@ def fetch_no_community_links():
     url = f"{BASE}/api/datasets?{urlencode({'q': q, 'sort': 'newest'})}"
     return _newest_links_from_url(url)
 
+def _community_agg(aggs):
+    """Agregace přes parent.communities.ids (název agregace se liší podle konfigurace)."""
+    if not isinstance(aggs, dict):
+        return None
+    for name in ("communities", "community", "parent.communities.ids", "parent.communities"):
+        agg = aggs.get(name)
+        if isinstance(agg, dict) and isinstance(agg.get("buckets"), list):
+            return agg
+    return None
+
+def fetch_community_facets():
+    """
+    Počty záznamů po komunitách z agregací jednoho vyhledávacího dotazu.
+    Vrací ({id nebo slug komunity: počet}, oříznuto, `updated` naposledy změněného záznamu),
+    nebo None, pokud API agregaci nevrací. Terms agregace vrací jen top-N bucketů:
+    oříznuto = True/False podle sum_other_doc_count, None, když ho API neposílá.
+    """
+    data = safe_get_json(f"{BASE}/api/datasets?{urlencode({'size': 1, 'sort': 'updated-desc'})}")
+    agg = _community_agg(data.get("aggregations") if isinstance(data, dict) else None)
+    if agg is None:
+        return None
+    counts = {b["key"]: b.get("doc_count", 0) for b in agg["buckets"] if isinstance(b, dict) and b.get("key")}
+    other = agg.get("sum_other_doc_count")
+    hits, _ = normalize_hits(data)
+    newest = max(map(_updated_key, hits), default=None)
+    return counts, (None if other is None else other > 0), newest
+
+def local_community_frame(raw_dir):
+    """
+    Tabulka (community, seq, updated, link) z lokálního RAW úložiště (nrp_dump/raw):
+    řádek za každou dvojici záznam × komunita z parent.communities.ids,
+    záznamy mimo komunity mají community = "".
+    """
+    rows = []
+    for seq, rec in enumerate(RawStore(raw_dir)):
+        cids = ((rec.get("parent") or {}).get("communities") or {}).get("ids") or [""]
+        link = (_markdown_links([rec]) or [None])[0]
+        upd = record_updated(rec)
+        for cid in cids:
+            rows.append((cid, seq, upd, link))
+    df = pd.DataFrame(rows, columns=["community", "seq", "updated", "link"])
+    df["updated"] = pd.to_datetime(df["updated"], utc=True, format="ISO8601", errors="coerce")
+    return df
+
+def parquet_community_frame(parquet):
+    """
+    Totéž jako local_community_frame(), ale jen ze sloupců records_flat.parquet
+    (id, updated, url, community_ids) – bez čtení RAW JSON.
+    """
+    import pyarrow.parquet as pq
+    return community_frame(pq.read_table(parquet, columns=["id", "updated", "url", "community_ids"]).to_pandas())
+
+def community_frame(records):
+    """Tabulka pro local_summary() z už načtených řádků records_flat (id, updated, url, community_ids)."""
+    df = records[["id", "updated", "url", "community_ids"]].copy()
+    df["seq"] = range(len(df))
+    df["link"] = [f"[{rid}]({url})" if url else rid for rid, url in zip(df["id"], df["url"])]
+    df["community"] = [list(c) if c is not None and len(c) else [""] for c in df["community_ids"]]
+    df = df.explode("community", ignore_index=True)
+    df["updated"] = pd.to_datetime(df["updated"], utc=True, errors="coerce")
+    return df[["community", "seq", "updated", "link"]]
+
+def _has_community_columns(parquet):
+    import pyarrow.parquet as pq
+    return os.path.exists(parquet) and "community_ids" in pq.read_schema(parquet).names
+
+def local_summary(df):
+    """
+    Vektorové group-by nad local_community_frame(): ({komunita: počet}, {komunita: [5 odkazů]}),
+    nejnovější podle `updated` (shoda: dřív ve výpisu). Klíč None = záznamy mimo komunity.
+    """
+    counts = df.groupby("community", sort=False).size()
+    newest = (df.dropna(subset=["link"])
+                .sort_values(["updated", "seq"], ascending=[False, True], na_position="last", kind="stable")
+                .groupby("community", sort=False).head(5)
+                .groupby("community", sort=False)["link"].agg(list))
+    fix = lambda k: k or None
+    return ({fix(k): int(v) for k, v in counts.items()},
+            {fix(k): v for k, v in newest.items()})
+
+def scan_local(raw_dir):
+    """
+    Počty a odkazy na 5 nejnovějších po komunitách z lokálního harvestu (bez dotazů na API):
+    z records_flat.parquet vedle RAW úložiště, u staršího Parquetu bez komunit z RAW hitů.
+    """
+    parquet = os.path.join(os.path.dirname(os.path.normpath(raw_dir)), "records_flat.parquet")
+    if _has_community_columns(parquet):
+        return local_summary(parquet_community_frame(parquet))
+    return local_summary(local_community_frame(raw_dir))
+
+def _store_newest(raw_dir):
+    """Nejnovější `updated` v RAW úložišti (jen z indexu, bez čtení záznamů)."""
+    stamps = [e[3] for e in RawStore(raw_dir).records.values() if e[3]]
+    return max((_updated_key({"updated": s}) for s in stamps), default=None)
+
+def _map_concurrent(fn, items, concurrency):
+    """fn přes items v omezeném poolu vláken; výsledky ve vstupním pořadí (deterministický report)."""
+    items = list(items)
+    if concurrency <= 1 or len(items) <= 1:
+        return [fn(it) for it in items]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as ex:
+        return list(ex.map(fn, items))
+
+def facet_rows(ids, aliases, raw_dir, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Řádky reportu s (téměř) konstantním počtem dotazů: počty z agregací (fallback: lokální
+    RAW úložiště), odkazy na nejnovější záznamy z lokálního úložiště, pokud je k dispozici
+    a odpovídá API; jinak se stahují jen pro komunity, které nějaké záznamy mají.
+    Komunity, které se do (oříznuté) agregace nevešly, se dotazují jednotlivě.
+    Vrací ([(slug, total, links)], (total, links) pro záznamy mimo komunity).
+    """
+    local = scan_local(raw_dir) if RawStore.exists(raw_dir) else None
+    facets = fetch_community_facets()
+    from_local = facets is None
+    if from_local:
+        if local is None:
+            return None
+        print(f"[i] No community aggregation in the API response – counting from {raw_dir}", file=sys.stderr)
+        counts, truncated, api_newest = local[0], False, None
+    else:
+        counts, truncated, api_newest = facets
+    by_slug = {}
+    for key, n in counts.items():
+        if key is not None:
+            slug = aliases.get(key, key)
+            by_slug[slug] = by_slug.get(slug, 0) + n
+    slug_to_id = {slug: cid for cid, slug in aliases.items()}
+    local_key = lambda cid: slug_to_id.get(cid, cid)
+
+    # chybějící bucket = 0 jen u agregace, o které víme, že oříznutá není
+    missing = [cid for cid in ids if cid not in by_slug]
+    api = {}
+    if missing and truncated is not False:
+        print(f"[i] Community aggregation may be truncated – {len(missing)} communities without a bucket "
+              "are counted one by one", file=sys.stderr)
+        api = dict(zip(missing, _map_concurrent(fetch_5_newest_links, missing, concurrency)))
+        for cid, (total, _) in api.items():
+            by_slug[cid] = total
+
+    # odkazy z lokálního úložiště jen tam, kde sedí s API (úložiště může být starší než odpověď)
+    if local is None:
+        stale = set(ids)
+    elif from_local:
+        stale = set()
+    else:
+        store_newest = _store_newest(raw_dir)
+        if api_newest is not None and (store_newest is None or store_newest < api_newest):
+            print(f"[i] {raw_dir} is older than the API – newest links are fetched from the API", file=sys.stderr)
+            stale = set(ids)
+        else:
+            stale = {cid for cid in ids if local[0].get(local_key(cid), 0) != by_slug.get(cid, 0)}
+    need = [cid for cid in ids if cid in stale and cid not in api and by_slug.get(cid)]
+    api.update(zip(need, _map_concurrent(fetch_5_newest_links, need, concurrency)))
+    links = {cid: api[cid][1] if cid in api else local[1].get(local_key(cid), []) if local else []
+             for cid in ids}
+    rows = [(cid, by_slug.get(cid, 0), links[cid]) for cid in ids]
+
+    if from_local:
+        no_comm = (local[0].get(None, 0), local[1].get(None, []))
+    else:
+        no_comm = fetch_no_community_links()
+    return rows, no_comm
+
+def local_rows(ids, aliases, raw_dir, summary=None):
+    """
+    Report čistě z lokálního harvestu: žádný dotaz kromě (cachovaného) výpisu komunit.
+    `summary` = hotový local_summary() (report.py ho počítá z už načtené tabulky).
+    """
+    counts, newest = summary if summary is not None else scan_local(raw_dir)
+    slug_to_id = {slug: cid for cid, slug in aliases.items()}
+    rows = []
+    for cid in ids:
+        key = slug_to_id.get(cid, cid)
+        rows.append((cid, counts.get(key, 0), newest.get(key, [])))
+    return rows, (counts.get(None, 0), newest.get(None, []))
+
+def load_communities(snapshot=COMMUNITIES_SNAPSHOT):
+    """
+    collect_community_ids() + uložení výsledku do snapshotu; když API neodpoví,
+    použije se poslední snapshot (titulky komunit se mění jen zřídka).
+    """
+    try:
+        ids, titles, aliases = collect_community_ids()
+    except (requests.RequestException, ValueError) as e:
+        if not Path(snapshot).exists():
+            raise
+        print(f"[!] Community listing failed ({e}) – using {snapshot}", file=sys.stderr)
+        with open(snapshot, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+        return snap["ids"], snap["titles"], snap["aliases"]
+    Path(snapshot).parent.mkdir(parents=True, exist_ok=True)
+    with open(snapshot, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "titles": titles, "aliases": aliases}, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    return ids, titles, aliases
+
+def scan_rows(ids, concurrency=DEFAULT_CONCURRENCY):
+    """Původní režim: jeden dotaz na každou komunitu + jeden na záznamy mimo komunity (paralelně)."""
+    results = _map_concurrent(fetch_5_newest_links, ids, concurrency)
+    rows = [(cid, total, links) for cid, (total, links) in zip(ids, results)]
+    return rows, fetch_no_community_links()
+
 def main():
-    ids, titles = collect_community_ids()
+    ap = argparse.ArgumentParser(description="Per-community record counts (nrp_by_community.md).")
+    ap.add_argument("--mode", choices=("facets", "scan", "local"), default="facets",
+                    help="facets = counts from one search request with aggregations (fallback: local raw store); "
+                         "scan = one request per community; "
+                         "local = everything from the harvested raw store, only community titles from the API")
+    ap.add_argument("--raw", default=os.path.join("nrp_dump", "raw"),
+                    help="Harvested raw store used for counts/newest links when available")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                    help="Parallel requests when communities are scanned one by one")
+    ap.add_argument("--out", default="nrp_by_community.md")
+    args = ap.parse_args()
+    if args.mode == "local" and not RawStore.exists(args.raw):
+        sys.exit(f"[!] No harvested raw store at {args.raw} – run harvest_nrp.py first")
+    write_report(args.mode, args.raw, args.out, args.concurrency)
+
+def write_report(mode="local", raw_dir=os.path.join("nrp_dump", "raw"), out="nrp_by_community.md",
+                 concurrency=DEFAULT_CONCURRENCY, summary=None, snapshot=COMMUNITIES_SNAPSHOT):
+    """Sestaví a zapíše nrp_by_community.md; `summary` viz local_rows(), `snapshot` viz load_communities()."""
+    use_concurrency(concurrency)
+    ids, titles, aliases = load_communities(snapshot)
+    print(f"[i] Communities: {len(ids)}", file=sys.stderr)
+    if mode == "local":
+        result = local_rows(ids, aliases, raw_dir, summary)
+    elif mode == "facets":
+        result = facet_rows(ids, aliases, raw_dir, concurrency)
+    else:
+        result = None
+    if result is None:
+        if mode == "facets":
+            print("[!] No aggregation and no local raw store – falling back to per-community requests",
+                  file=sys.stderr)
+        result = scan_rows(ids, concurrency)
+    rows, (nc_total, nc_links) = result
+
     lines = []
     lines.append("| Community (ID) | Name | Records | Links (5 newest) |")
     lines.append("|---|---|---:|---|")
     grand_total = 0
-    for cid in ids:
-        total, links = fetch_5_newest_links(cid)
+    for cid, total, links in rows:
         try:
             grand_total += int(total)
         except (TypeError, ValueError):
@@ -145,7 +437,6 @@ def main():
         sample = "<br>".join(links) if links else "—"
         lines.append(f"| `{cid}` | {name} | {total if total is not None else '—'} | {sample} |")
     # záznamy mimo komunity – stejný výpočet jako pro komunity
-    nc_total, nc_links = fetch_no_community_links()
     try:
         grand_total += int(nc_total)
     except (TypeError, ValueError):
@@ -156,7 +447,6 @@ def main():
     lines.append(f"| **Total** | — | **{grand_total}** | — |\n  ")
     lines.append(f"_Source: {BASE}_\n")
 
-    out = "nrp_by_community.md"
     with open(out, "w", encoding="utf-8") as f:
         f.write("\n".join(lines) + "\n")
     print(f"Hotovo: {out}")
@@ -1,10 +1,10 @@
-import pandas as pd
+import hashlib
+import json
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import StrMethodFormatter  # added
 from pathlib import Path
 
-PARQUET = "nrp_dump/records_flat.parquet"
+import nrp_db
+
 OUT_DIR = Path("nrp_dump")
 
 # ====== Barvy EOSC ======
@@ -14,7 +14,7 @@ EOSC_GREY  = "#E4E3E3"   # Light Grey    RGB 228/227/227
 EOSC_WHITE = "#FFFFFF"   # White         RGB 255/255/255
 INK        = "#1f2937"   # čitelný text/osy na bílém podkladu
 
-plt.rcParams.update({
+RC = {
     "figure.facecolor": EOSC_WHITE,
     "axes.facecolor":   EOSC_WHITE,
     "axes.edgecolor":   INK,
@@ -23,127 +23,188 @@ plt.rcParams.update({
     "xtick.color":      INK,
     "ytick.color":      INK,
     "font.size":        11,
-})
-
-def _save(fig, path):
-    fig.savefig(path, dpi=150, facecolor=EOSC_WHITE)
-    plt.close(fig)
+}
+DPI = 150
+
+# Graf se kreslí znovu jen tehdy, když se změní jeho vstupní agregáty, styl nebo tenhle
+# skript – otisky posledních vykreslení drží nrp_dump/charts.json. PNG nemá v metadatech
+# verzi matplotlibu, takže stejné vstupy = bajtově stejný soubor (a žádný commit navíc).
+CACHE_NAME = "charts.json"
+_CODE = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+_plt = None
+
+def _pyplot():
+    """matplotlib se importuje až u prvního grafu, který se opravdu kreslí."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use("Agg")  # jen ukládáme soubory (i mimo hlavní vlákno, viz report.py)
+        import matplotlib.pyplot as plt
+        plt.rcParams.update(RC)
+        _plt = plt
+    return _plt
+
+def _jsonable(v):
+    return v.tolist() if isinstance(v, (np.ndarray, np.generic)) else str(v)
+
+def chart_key(data) -> str:
+    """Otisk grafu: agregáty + styl + kód skriptu."""
+    payload = json.dumps({"data": data, "rc": RC, "dpi": DPI, "code": _CODE}, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _read_cache(out_dir):
+    try:
+        with open(Path(out_dir) / CACHE_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _unchanged(path, key) -> bool:
+    if path.exists() and _read_cache(path.parent).get(path.name) == key:
+        print(f"[i] Unchanged: {path}")
+        return True
+    return False
+
+def _save(fig, path, key):
+    fig.savefig(path, dpi=DPI, facecolor=EOSC_WHITE, metadata={"Software": None})
+    _pyplot().close(fig)
+    cache = _read_cache(path.parent)
+    cache[path.name] = key
+    with open(path.parent / CACHE_NAME, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+        f.write("\n")
     print(f"[✓] Saved: {path}")
 
-# Načtení a příprava dat
-df = pd.read_parquet(PARQUET)
-sizes_b = pd.to_numeric(df["bytes_total"], errors="coerce").dropna()
-sizes_b = sizes_b[sizes_b > 0]  # jen kladné
-sizes_gb = sizes_b / (1024**3)
+GB = 1024**3
 
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # -------------------------
 # 1) Histogram (logaritmická osa X)
 # -------------------------
-fig = plt.figure(figsize=(9, 5.5))
-
-# Log-binning pro přehlednost: 50 logaritmicky rovnoměrných košů
-xmin = sizes_gb.min()
-xmax = sizes_gb.max()
-# ošetření, kdyby byly všechny stejné (vzácné)
-if xmin == xmax:
-    bins = 10
-else:
-    bins = np.geomspace(xmin, xmax, 50)
-
-plt.hist(sizes_gb, bins=bins, color=EOSC_GREEN, edgecolor=EOSC_WHITE, linewidth=0.5)
-
-# POŽADAVEK: hlavní značky 0.1, 1, 10, 100, ...
-ax = plt.gca()
-ax.set_xscale("log")
-lo = int(np.floor(np.log10(xmin)))
-hi = int(np.ceil(np.log10(xmax)))
-major_ticks = [10 ** k for k in range(lo, hi + 1)]
-ax.set_xticks(major_ticks)
-ax.xaxis.set_major_formatter(StrMethodFormatter("{x:g}"))
-ax.grid(True, which="major", axis="y", color=EOSC_GREY, linestyle="--", alpha=0.9)
-ax.set_axisbelow(True)
-for spine in ("top", "right"):
-    ax.spines[spine].set_visible(False)
-
-plt.xlabel("Dataset size [GB] (log scale)")
-plt.ylabel("Number of datasets")
-plt.title("Distribution of dataset sizes (catch-all)")
-plt.tight_layout()
-_save(fig, OUT_DIR / "size_histogram.png")
+def plot_histogram(stats, hist, out_dir=OUT_DIR):
+    path = out_dir / "size_histogram.png"
+    # Log-binning pro přehlednost: koše i četnosti už spočítala tabulka size_histogram
+    # (50 logaritmicky rovnoměrných hran mezi min a max); hist s vahami = stejné sloupce
+    xmin = stats["min"] / GB
+    xmax = stats["max"] / GB
+    key = chart_key({"chart": "histogram", "min": xmin, "max": xmax, "n": stats["n"],
+                     "bins": hist[["lo", "hi", "count"]].to_numpy()})
+    if _unchanged(path, key):
+        return
+    plt = _pyplot()
+    from matplotlib.ticker import StrMethodFormatter
+    fig = plt.figure(figsize=(9, 5.5))
+
+    # ošetření, kdyby byly všechny stejné (vzácné) – pak koše z tabulky nedávají smysl;
+    # jediná hodnota s vahou n nakreslí totéž co hist přes n stejných hodnot
+    if xmin == xmax:
+        plt.hist([xmin], bins=10, weights=[stats["n"]], color=EOSC_GREEN, edgecolor=EOSC_WHITE, linewidth=0.5)
+    else:
+        edges = np.append(hist["lo"].to_numpy(), hist["hi"].to_numpy()[-1:]) / GB
+        plt.hist(edges[:-1], bins=edges, weights=hist["count"].to_numpy(), color=EOSC_GREEN, edgecolor=EOSC_WHITE,
+                 linewidth=0.5)
+
+    # POŽADAVEK: hlavní značky 0.1, 1, 10, 100, ...
+    ax = plt.gca()
+    ax.set_xscale("log")
+    lo = int(np.floor(np.log10(xmin)))
+    hi = int(np.ceil(np.log10(xmax)))
+    major_ticks = [10 ** k for k in range(lo, hi + 1)]
+    ax.set_xticks(major_ticks)
+    ax.xaxis.set_major_formatter(StrMethodFormatter("{x:g}"))
+    ax.grid(True, which="major", axis="y", color=EOSC_GREY, linestyle="--", alpha=0.9)
+    ax.set_axisbelow(True)
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+
+    plt.xlabel("Dataset size [GB] (log scale)")
+    plt.ylabel("Number of datasets")
+    plt.title("Distribution of dataset sizes (catch-all)")
+    plt.tight_layout()
+    _save(fig, path, key)
 
-# -------------------------
-# 2) Kumulativní křivka (CDF)
-# -------------------------
-fig = plt.figure(figsize=(9, 5.5))
-
-sizes_sorted = np.sort(sizes_gb.values)
-cdf = np.arange(1, len(sizes_sorted) + 1) / len(sizes_sorted)
-
-plt.plot(sizes_sorted, cdf, color=EOSC_GREEN, linewidth=2)
-
-# POŽADAVEK: hlavní značky 0.1, 1, 10, 100, ... (stejně jako u histogramu)
-ax = plt.gca()
-ax.set_xscale("log")
-lo2 = int(np.floor(np.log10(xmin)))
-hi2 = int(np.ceil(np.log10(xmax)))
-major_ticks2 = [10 ** k for k in range(lo2, hi2 + 1)]
-ax.set_xticks(major_ticks2)
-ax.xaxis.set_major_formatter(StrMethodFormatter("{x:g}"))
-# medián jako pink referenční linka
-median_gb = float(np.median(sizes_gb.values))
-ax.axvline(median_gb, color=EOSC_PINK, linewidth=2, linestyle="--")
-ax.text(median_gb, 0.03, "  median", color=EOSC_PINK, fontsize=9, ha="left", va="bottom")
-
-for spine in ("top", "right"):
-    ax.spines[spine].set_visible(False)
-
-plt.xlabel("Dataset size [GB] (log scale)")
-plt.ylabel("Cumulative fraction of records")
-plt.title("Cumulative distribution of sizes (catch-all)")
-plt.grid(True, which="both", axis="both", color=EOSC_GREY, linestyle="--", alpha=0.9)
-ax.set_axisbelow(True)
-plt.tight_layout()
-_save(fig, OUT_DIR / "cumulative_distribution.png")
 
 # -------------------------
-# 3) Počet záznamů podle čtvrtletí publikování
+# 2) Kumulativní křivka (CDF)
 # -------------------------
-pub = pd.to_datetime(df["publication_date"], errors="coerce").dropna()
-if not pub.empty:
-    q = pub.dt.to_period("Q")
-    counts = q.value_counts().sort_index()
-    # doplň chybějící čtvrtletí nulou (souvislá osa min..max)
-    full_idx = pd.period_range(counts.index.min(), counts.index.max(), freq="Q")
-    counts = counts.reindex(full_idx, fill_value=0)
-
-    labels = [f"{p.year} Q{p.quarter}" for p in counts.index]
-    x = np.arange(len(counts))
-
-    fig = plt.figure(figsize=(max(9, len(counts) * 0.5), 5.5))
+def plot_cdf(stats, cdf, out_dir=OUT_DIR):
+    path = out_dir / "cumulative_distribution.png"
+    # CDF z tabulky size_cdf: pevný počet kvantilových bodů (nrp_db.CDF_POINTS) místo
+    # jednoho vrcholu na záznam – cena i velikost grafu nerostou s katalogem
+    key = chart_key({"chart": "cdf", "min": stats["min"], "max": stats["max"], "median": stats["median"],
+                     "points": cdf[["fraction", "bytes"]].to_numpy()})
+    if _unchanged(path, key):
+        return
+    plt = _pyplot()
+    from matplotlib.ticker import StrMethodFormatter
+    fig = plt.figure(figsize=(9, 5.5))
+
+    plt.plot(cdf["bytes"].to_numpy() / GB, cdf["fraction"].to_numpy(), color=EOSC_GREEN, linewidth=2)
+
+    # POŽADAVEK: hlavní značky 0.1, 1, 10, 100, ... (stejně jako u histogramu)
     ax = plt.gca()
-    ax.bar(x, counts.values, color=EOSC_GREEN, edgecolor=EOSC_WHITE, linewidth=0.8, width=0.8)
+    ax.set_xscale("log")
+    lo2 = int(np.floor(np.log10(stats["min"] / GB)))
+    hi2 = int(np.ceil(np.log10(stats["max"] / GB)))
+    major_ticks2 = [10 ** k for k in range(lo2, hi2 + 1)]
+    ax.set_xticks(major_ticks2)
+    ax.xaxis.set_major_formatter(StrMethodFormatter("{x:g}"))
+    # medián jako pink referenční linka
+    median_gb = stats["median"] / GB
+    ax.axvline(median_gb, color=EOSC_PINK, linewidth=2, linestyle="--")
+    ax.text(median_gb, 0.03, "  median", color=EOSC_PINK, fontsize=9, ha="left", va="bottom")
 
-    # přímé popisky nad nenulovými sloupci
-    for xi, v in zip(x, counts.values):
-        if v > 0:
-            ax.text(xi, v, str(int(v)), ha="center", va="bottom", fontsize=8, color=INK)
-
-    ax.set_xticks(x)
-    ax.set_xticklabels(labels, rotation=45, ha="right", fontsize=9)
-    ax.grid(True, which="major", axis="y", color=EOSC_GREY, linestyle="--", alpha=0.9)
-    ax.set_axisbelow(True)
-    ax.margins(y=0.12)
     for spine in ("top", "right"):
         ax.spines[spine].set_visible(False)
 
-    plt.ylabel("Number of records")
-    plt.title("Records by publication quarter (catch-all)")
+    plt.xlabel("Dataset size [GB] (log scale)")
+    plt.ylabel("Cumulative fraction of records")
+    plt.title("Cumulative distribution of sizes (catch-all)")
+    plt.grid(True, which="both", axis="both", color=EOSC_GREY, linestyle="--", alpha=0.9)
+    ax.set_axisbelow(True)
     plt.tight_layout()
-    _save(fig, OUT_DIR / "records_by_quarter.png")
-else:
-    print("[!] Bez publication_date – čtvrtletní graf přeskočen")
+    _save(fig, path, key)
+
+
+# -------------------------
+# 3) Počet záznamů podle čtvrtletí publikování
+# -------------------------
+def plot_quarters(quarters, out_dir=OUT_DIR):
+    # tabulka quarterly_counts je už souvislá řada min..max (chybějící čtvrtletí = 0)
+    if not quarters.empty:
+        counts = quarters["count"]
+        labels = quarters["label"].tolist()
+        path = out_dir / "records_by_quarter.png"
+        key = chart_key({"chart": "quarters", "labels": labels, "counts": counts.to_numpy()})
+        if _unchanged(path, key):
+            return
+        plt = _pyplot()
+        x = np.arange(len(counts))
+
+        fig = plt.figure(figsize=(max(9, len(counts) * 0.5), 5.5))
+        ax = plt.gca()
+        ax.bar(x, counts.values, color=EOSC_GREEN, edgecolor=EOSC_WHITE, linewidth=0.8, width=0.8)
+
+        # přímé popisky nad nenulovými sloupci
+        for xi, v in zip(x, counts.values):
+            if v > 0:
+                ax.text(xi, v, str(int(v)), ha="center", va="bottom", fontsize=8, color=INK)
+
+        ax.set_xticks(x)
+        ax.set_xticklabels(labels, rotation=45, ha="right", fontsize=9)
+        ax.grid(True, which="major", axis="y", color=EOSC_GREY, linestyle="--", alpha=0.9)
+        ax.set_axisbelow(True)
+        ax.margins(y=0.12)
+        for spine in ("top", "right"):
+            ax.spines[spine].set_visible(False)
+
+        plt.ylabel("Number of records")
+        plt.title("Records by publication quarter (catch-all)")
+        plt.tight_layout()
+        _save(fig, path, key)
+    else:
+        print("[!] Bez publication_date – čtvrtletní graf přeskočen")
+
 
 # Volitelný textový souhrn do konzole
 def fmt_bytes(n):
@@ -154,13 +215,36 @@ def fmt_bytes(n):
         n /= 1024.0; i += 1
     return f"{n:,.2f} {units[i]}"
 
-mean_b = sizes_b.mean()
-median_b = sizes_b.median()
-p90_b = np.quantile(sizes_b, 0.90)
-p99_b = np.quantile(sizes_b, 0.99)
 
-print(f"Number of datasets: {len(sizes_b)}")
-print(f"Average size: {fmt_bytes(mean_b)}")
-print(f"Median:           {fmt_bytes(median_b)}")
-print(f"90th percentile:  {fmt_bytes(p90_b)}")
-print(f"99th percentile:  {fmt_bytes(p99_b)}")
+def print_summary(stats):
+    mean_b = stats["mean"]
+    median_b = stats["median"]
+    p90_b = stats["p90"]
+    p99_b = stats["p99"]
+
+    print(f"Number of datasets: {int(stats['n'])}")
+    print(f"Average size: {fmt_bytes(mean_b)}")
+    print(f"Median:           {fmt_bytes(median_b)}")
+    print(f"90th percentile:  {fmt_bytes(p90_b)}")
+    print(f"99th percentile:  {fmt_bytes(p99_b)}")
+
+
+def render(stats, hist, cdf, quarters, out_dir=OUT_DIR):
+    """Všechny tři grafy + textový souhrn z předpočítaných agregátů (viz nrp_db.py)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    plot_histogram(stats, hist, out_dir)
+    plot_cdf(stats, cdf, out_dir)
+    plot_quarters(quarters, out_dir)
+    print_summary(stats)
+
+
+def main():
+    # Data: předpočítané souhrny z DuckDB (nrp_db.py), jen kladné velikosti
+    render(nrp_db.size_stats("positive"), nrp_db.size_histogram(),
+           nrp_db.size_cdf(),
+           nrp_db.quarterly_counts())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Asynchronní engine pro harvest_nrp.py (`--engine async`).
+
+Stejná logika jako iter_datasets() / fetch_detail_if_needed() / fetch_files_via_link()
+v harvest_nrp.py, jen jako korutiny nad nrp_http.AsyncClient (httpx): stovky
+rozpracovaných dotazů na jednom event loopu místo vlákna na dotaz.
+Parsování odpovědí (hity, agregáty souborů) se sdílí se synchronní cestou.
+
+Pro hlavní smyčku harvest_nrp.main() je vše zabalené do enrich_listing(), což je
+obyčejný (synchronní) iterátor – event loop běží ve vlákně na pozadí.
+"""
+import asyncio
+import queue
+import threading
+from collections import deque
+from urllib.parse import urljoin
+
+from harvest_nrp import (_extract_hits, _record_id, compute_files_inline_aggregates, file_entries,
+                         files_aggregates_from_payload, safe_get)
+from nrp_http import AsyncClient
+
+
+async def iter_datasets_async(client: AsyncClient, start_url: str, page_size: int, max_records: int | None,
+                              on_page=None):
+    url = start_url
+    params = {"size": page_size} if "?" not in url and page_size else None
+    seen = 0
+    while True:
+        data = await client.get_json(url, params=params)
+        hits = _extract_hits(data)
+        for h in hits:
+            yield h
+        seen += len(hits)
+        next_url = (data.get("links") or {}).get("next") if isinstance(data, dict) else None
+        if on_page is not None:
+            on_page(seen, next_url if hits else None)
+        if max_records and seen >= max_records:
+            return
+        if not next_url or not hits:
+            return
+        url, params = next_url, None
+
+
+async def fetch_files_via_link_async(client: AsyncClient, link_url: str):
+    try:
+        data = await client.get_json(link_url)
+    except Exception:
+        return None, None, None
+    return (*files_aggregates_from_payload(data), file_entries(data))
+
+
+async def _sizes_from_detail(client: AsyncClient, url: str):
+    detail = await client.get_json(url)
+    fc, bt = compute_files_inline_aggregates(detail)
+    if fc is not None or bt is not None:
+        return fc, bt, detail, file_entries(detail)
+    files_link = safe_get(detail, ["links", "files"]) or safe_get(detail, ["links", "bucket"])
+    if files_link:
+        fc2, bt2, entries2 = await fetch_files_via_link_async(client, files_link)
+        if fc2 is not None or bt2 is not None:
+            return fc2, bt2, detail, entries2
+    return None, None, detail, None
+
+
+async def fetch_detail_if_needed_async(client: AsyncClient, hit: dict, base_for_detail: str | None):
+    """Viz harvest_nrp.fetch_detail_if_needed() – stejné pořadí pokusů."""
+    fc, bt = compute_files_inline_aggregates(hit)
+    if (fc or 0) > 0 or (bt or 0) > 0:
+        return fc, bt, None, file_entries(hit)
+
+    files_link = safe_get(hit, ["links", "files"]) or safe_get(hit, ["links", "bucket"])
+    if files_link:
+        fc2, bt2, entries2 = await fetch_files_via_link_async(client, files_link)
+        if fc2 is not None or bt2 is not None:
+            return fc2, bt2, None, entries2
+
+    self_link = safe_get(hit, ["links", "self"])
+    if self_link:
+        try:
+            return await _sizes_from_detail(client, self_link)
+        except Exception:
+            pass
+
+    rid = _record_id(hit)
+    if base_for_detail and rid:
+        try:
+            return await _sizes_from_detail(client, urljoin(base_for_detail, f"{rid}/"))
+        except Exception:
+            pass
+
+    return None, None, None, None
+
+
+async def _aprefetch(agen, maxsize: int):
+    """Čte async generátor v samostatném tasku, aby se další stránka stahovala dopředu."""
+    q = asyncio.Queue(maxsize=max(maxsize, 1))
+    done = object()
+
+    async def produce():
+        try:
+            async for item in agen:
+                await q.put((None, item))
+        except Exception as e:
+            await q.put((e, None))
+            return
+        await q.put((None, done))
+
+    task = asyncio.ensure_future(produce())
+    try:
+        while True:
+            err, item = await q.get()
+            if err is not None:
+                raise err
+            if item is done:
+                return
+            yield item
+    finally:
+        task.cancel()
+
+
+async def enrich_hits_async(client: AsyncClient, hits, base_for_detail: str | None, concurrency: int,
+                            known: dict | None = None):
+    """Obdoba harvest_nrp.enrich_hits(): nejvýš `concurrency` dotazů naráz, výstup ve vstupním pořadí."""
+    sem = asyncio.Semaphore(max(concurrency, 1))
+
+    async def resolve(hit):
+        if known:
+            rid = _record_id(hit)
+            if rid in known:
+                fc, bt, entries = known[rid]
+                return fc, bt, None, entries
+        async with sem:
+            return await fetch_detail_if_needed_async(client, hit, base_for_detail)
+
+    window = max(concurrency, 1) * 4
+    pending = deque()
+    try:
+        async for hit in hits:
+            pending.append((hit, asyncio.ensure_future(resolve(hit))))
+            if len(pending) >= window:
+                h, task = pending.popleft()
+                yield (h, *(await task))
+        while pending:
+            h, task = pending.popleft()
+            yield (h, *(await task))
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def enrich_listing(start_url: str, base_for_detail: str | None, *, page_size: int, max_records: int | None,
+                   concurrency: int, token: str | None = None, cache=None, limiter=None,
+                   known: dict | None = None, on_page=None):
+    """
+    Synchronní iterátor (hit, files_count, bytes_total, detail, files) nad asynchronním během
+    výpisu + dopočtu velikostí. Pořadí odpovídá výpisu; `on_page` se volá z vlákna event loopu.
+    """
+    out = queue.Queue(maxsize=max(concurrency, 1) * 4)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # blokující put běží mimo event loop; při předčasném ukončení konzumenta skončíme
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def run():
+        # +1 spojení pro výpis, ať další stránka nečeká za `concurrency` rozběhnutými dopočty
+        client = AsyncClient(token, max_connections=max(concurrency, 1) + 1, cache=cache, limiter=limiter)
+        loop = asyncio.get_running_loop()
+        try:
+            listing = _aprefetch(iter_datasets_async(client, start_url, page_size, max_records, on_page),
+                                 maxsize=2 * page_size)
+            async for item in enrich_hits_async(client, listing, base_for_detail, concurrency, known):
+                if not await loop.run_in_executor(None, put, (None, item)):
+                    return
+        finally:
+            await client.aclose()
+
+    def thread_main():
+        try:
+            asyncio.run(run())
+        except BaseException as e:  # předáme dál do hlavního vlákna
+            put((e, None))
+            return
+        put((None, done))
+
+    t = threading.Thread(target=thread_main, name="async-engine", daemon=True)
+    t.start()
+    try:
+        while True:
+            err, item = out.get()
+            if err is not None:
+                raise err
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
@@ -1,27 +1,19 @@
 #!/usr/bin/env python3
-import argparse, json, os, sys, time
-from urllib.parse import urljoin
+import argparse, atexit, json, os, queue, sys, threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urljoin
 import requests
 
-DEFAULT_URL = "https://datarepo.eosc.cz/api/datasets"
+from nrp_extract import (extract_affiliation_list, extract_community_ids, extract_community_slug, extract_doi,
+                         extract_publication_year, extract_title, extract_ui_url)
+from nrp_http import default_cache, get_session, polite_get
+from raw_store import RawStore, RawStoreWriter, encode_record, import_jsonl
+from ratelimit import AdaptiveRateLimiter
+from size_sketch import SKETCH_NAME, SizeSketch, load_sketch, save_sketch
 
-def get_session(token: str | None):
-    s = requests.Session()
-    s.headers.update({"Accept": "application/json"})
-    if token:
-        s.headers.update({"Authorization": f"Bearer {token}"})
-    return s
-
-def polite_get(s: requests.Session, url: str, params=None, retries=6):
-    for i in range(retries):
-        r = s.get(url, params=params, timeout=60)
-        if r.status_code in (429, 500, 502, 503, 504):
-            time.sleep((2 ** i) + 0.5)
-            continue
-        r.raise_for_status()
-        return r
-    r.raise_for_status()
-    return r
+DEFAULT_URL = "https://datarepo.eosc.cz/api/datasets"
 
 def _extract_hits(payload: dict):
     if isinstance(payload, list):
@@ -38,7 +30,12 @@ def _extract_hits(payload: dict):
         return payload["items"]
     return []
 
-def iter_datasets(session: requests.Session, start_url: str, page_size: int, max_records: int | None):
+def iter_datasets(session: requests.Session, start_url: str, page_size: int, max_records: int | None,
+                  on_page=None):
+    """
+    Prochází výpis přes `links.next`. Volitelný `on_page(seen, next_url)` se zavolá
+    po vydání všech hitů stránky (slouží pro checkpoint kurzoru).
+    """
     url = start_url
     params = {}
     if "?" not in url and page_size:
@@ -51,13 +48,160 @@ def iter_datasets(session: requests.Session, start_url: str, page_size: int, max
         for h in hits:
             yield h
         seen += len(hits)
+        next_url = (data.get("links") or {}).get("next") if isinstance(data, dict) else None
+        if on_page is not None:
+            on_page(seen, next_url if hits else None)
         if max_records and seen >= max_records:
             return
-        next_url = (data.get("links") or {}).get("next") if isinstance(data, dict) else None
         if not next_url or not hits:
             return
         url, params = next_url, None
 
+def _extract_total(payload: dict):
+    total = safe_get(payload, ["hits", "total"])
+    if isinstance(total, dict):
+        total = total.get("value")
+    return total if isinstance(total, int) else None
+
+def fetch_total(session: requests.Session, start_url: str):
+    """Vrátí hits.total výpisu (stačí stránka o jednom záznamu) nebo None."""
+    params = {"size": 1} if "?" not in start_url else None
+    try:
+        return _extract_total(polite_get(session, start_url, params=params).json())
+    except Exception:
+        return None
+
+def _search_url(start_url: str, params: dict):
+    sep = "&" if "?" in start_url else "?"
+    return start_url + sep + urlencode(params)
+
+def updated_since_url(start_url: str, since: str, page_size: int):
+    """Výpis omezený na záznamy změněné od `since` (včetně), seřazený od nejstaršího `updated` (sort=updated-asc)."""
+    return _search_url(start_url, {"q": f'updated:["{since}" TO *]', "sort": "updated-asc", "size": page_size})
+
+# ---------- sharding výpisu podle `created` ----------
+
+def created_range_url(start_url: str, lo: datetime, hi: datetime, page_size: int):
+    """Výpis záznamů s created v [lo, hi), nejnovější první (jako výchozí výpis)."""
+    q = f'created:["{lo.isoformat()}" TO "{hi.isoformat()}"}}'
+    return _search_url(start_url, {"q": q, "sort": "newest", "size": page_size})
+
+def fetch_created_bounds(session: requests.Session, start_url: str):
+    """(nejstarší, nejnovější) `created` v katalogu, nebo (None, None)."""
+    bounds = []
+    for sort in ("oldest", "newest"):
+        try:
+            data = polite_get(session, _search_url(start_url, {"sort": sort, "size": 1})).json()
+            hits = _extract_hits(data)
+            bounds.append(datetime.fromisoformat(hits[0]["created"]) if hits else None)
+        except Exception:
+            bounds.append(None)
+    return tuple(bounds)
+
+def plan_shards(session: requests.Session, start_url: str, shard_size: int):
+    """
+    Rozdělí katalog na disjunktní okna [lo, hi) podle `created` tak, aby v každém
+    bylo nejvýš `shard_size` záznamů (půlení okna podle hits.total).
+    Vrací okna od nejnovějšího; None, pokud meze nejdou zjistit.
+    """
+    oldest, newest = fetch_created_bounds(session, start_url)
+    if oldest is None or newest is None:
+        return None
+    shards = []
+    todo = [(oldest, newest + timedelta(microseconds=1))]
+    while todo:
+        lo, hi = todo.pop()
+        total = fetch_total(session, created_range_url(start_url, lo, hi, 1))
+        if total == 0:
+            continue
+        if total is not None and total > shard_size and hi - lo > timedelta(seconds=1):
+            mid = lo + (hi - lo) / 2
+            todo.append((lo, mid))
+            todo.append((mid, hi))  # novější polovina se zpracuje dřív
+            continue
+        shards.append((lo, hi))
+    return shards
+
+def iter_datasets_sharded(session: requests.Session, start_url: str, page_size: int, max_records: int | None,
+                          shard_size: int, workers: int):
+    """
+    Obdoba iter_datasets(): okna z plan_shards() stránkuje souběžně (nejvýš `workers` naráz),
+    hity vydává po oknech od nejnovějšího a odstraní duplicity podle `id`.
+    """
+    shards = plan_shards(session, start_url, shard_size)
+    if shards is None:
+        print("[!] Cannot determine created range – falling back to serial listing", file=sys.stderr)
+        yield from iter_datasets(session, start_url, page_size, max_records)
+        return
+    print(f"[i] Listing in {len(shards)} created-date shards", file=sys.stderr)
+
+    def fetch_shard(lo, hi):
+        return list(iter_datasets(session, created_range_url(start_url, lo, hi, page_size), page_size, None))
+
+    seen_ids = set()
+    emitted = 0
+    pending = deque()
+    window = max(workers, 1) * 2
+    todo = iter(shards)
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="shard") as pool:
+        while True:
+            for lo, hi in todo:
+                pending.append(pool.submit(fetch_shard, lo, hi))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            for h in pending.popleft().result():
+                rid = _record_id(h)
+                if rid in seen_ids:
+                    continue
+                seen_ids.add(rid)
+                yield h
+                emitted += 1
+                if max_records and emitted >= max_records:
+                    for fut in pending:
+                        fut.cancel()
+                    return
+
+def prefetch(iterable, maxsize: int):
+    """
+    Iteruje `iterable` ve vlákně na pozadí a položky předává přes omezenou frontu –
+    další stránka výpisu se tak stahuje, zatímco se ta předchozí obohacuje.
+    Výjimka z producenta se znovu vyhodí u konzumenta.
+    """
+    q = queue.Queue(maxsize=max(maxsize, 1))
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        q.put((None, item), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:  # předáme dál do hlavního vlákna
+            q.put((e, None))
+            return
+        q.put((None, done))
+
+    t = threading.Thread(target=produce, name="listing", daemon=True)
+    t.start()
+    try:
+        while True:
+            err, item = q.get()
+            if err is not None:
+                raise err
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
 def safe_get(d, path, default=None):
     cur = d
     for p in path:
@@ -67,6 +211,9 @@ def safe_get(d, path, default=None):
             return default
     return cur
 
+def _record_id(rec: dict):
+    return rec.get("id") or rec.get("pid") or rec.get("record_id")
+
 # ---------- výpočty velikostí ----------
 
 def compute_files_inline_aggregates(obj: dict):
@@ -99,7 +246,7 @@ def compute_files_inline_aggregates(obj: dict):
         return count, size
     return None, None
 
-def fetch_files_via_link(session: requests.Session, link_url: str):
+def files_aggregates_from_payload(data):
     """
     Očekává JSON pole/objekt se seznamem souborů.
     Podporované tvary:
@@ -108,11 +255,6 @@ def fetch_files_via_link(session: requests.Session, link_url: str):
       - {"hits":{"hits":[{"size":...}]}}
     Vrací (count, total_bytes) nebo (None, None) pokud se nepodaří.
     """
-    try:
-        data = polite_get(session, link_url).json()
-    except Exception:
-        return None, None
-
     # 1) entries list
     entries = safe_get(data, ["entries"])
     if isinstance(entries, list) and entries:
@@ -138,25 +280,64 @@ def fetch_files_via_link(session: requests.Session, link_url: str):
 
     return None, None
 
+def _file_entry(e: dict):
+    """Položka souboru → {key, size, checksum, mimetype} (řádek manifestu bez record_id)."""
+    mimetype = e.get("mimetype") or e.get("mime_type") or safe_get(e, ["metadata", "mimetype"])
+    checksum = e.get("checksum")
+    return {
+        "key": e.get("key") or e.get("filename") or e.get("name"),
+        "size": _parse_int(e.get("size")),
+        "checksum": checksum if isinstance(checksum, str) else None,
+        "mimetype": mimetype if isinstance(mimetype, str) else None,
+    }
+
+def file_entries(data):
+    """
+    Seznam souborů ze stejných tvarů jako files_aggregates_from_payload() a navíc
+    z inline `files.entries` (seznam i dict podle názvu). Vrací None, pokud tam žádné nejsou.
+    """
+    inline = safe_get(data, ["files", "entries"])
+    if isinstance(inline, dict):
+        inline = list(inline.values())
+    files = safe_get(data, ["files"])
+    for seq in (safe_get(data, ["entries"]), data, safe_get(data, ["hits", "hits"]),
+                safe_get(data, ["objects"]), files if isinstance(files, list) else inline):
+        if isinstance(seq, list) and seq:
+            entries = [_file_entry(e) for e in seq if isinstance(e, dict)]
+            if entries:
+                return entries
+    return None
+
+def fetch_files_via_link(session: requests.Session, link_url: str):
+    """
+    Stáhne `links.files` a vrátí (count, total_bytes, entries) – viz files_aggregates_from_payload()
+    a file_entries().
+    """
+    try:
+        data = polite_get(session, link_url).json()
+    except Exception:
+        return None, None, None
+    return (*files_aggregates_from_payload(data), file_entries(data))
+
 def fetch_detail_if_needed(session: requests.Session, hit: dict, base_for_detail: str | None):
     """
     Nejprve zkusí `links.files`. Pokud není k dispozici nebo vrací nic použitelného,
     teprve pak sáhne pro detail přes `links.self` nebo /datasets/<id>/.
-    Vrací tuple: (files_count, bytes_total, detail_obj_or_None)
+    Vrací tuple: (files_count, bytes_total, detail_obj_or_None, file_entries_or_None)
     """
     # 1) Inline agregáty? Ve výsledcích výpisu (/api/datasets) bývají soubory
     #    vynulované (count=0, total_bytes=0) i u záznamů, které soubory mají –
     #    proto nulové hodnoty ignorujeme a dotáhneme detail / links.files.
     fc, bt = compute_files_inline_aggregates(hit)
     if (fc or 0) > 0 or (bt or 0) > 0:
-        return fc, bt, None
+        return fc, bt, None, file_entries(hit)
 
     # 2) /files link?
     files_link = safe_get(hit, ["links", "files"]) or safe_get(hit, ["links", "bucket"])  # někdy bývá bucket
     if files_link:
-        fc2, bt2 = fetch_files_via_link(session, files_link)
+        fc2, bt2, entries2 = fetch_files_via_link(session, files_link)
         if fc2 is not None or bt2 is not None:
-            return fc2, bt2, None
+            return fc2, bt2, None, entries2
 
     # 3) detail přes self
     self_link = safe_get(hit, ["links", "self"])
@@ -166,14 +347,14 @@ def fetch_detail_if_needed(session: requests.Session, hit: dict, base_for_detail
             # zkus inline/entries i u detailu
             fc3, bt3 = compute_files_inline_aggregates(detail)
             if (fc3 is not None or bt3 is not None):
-                return fc3, bt3, detail
+                return fc3, bt3, detail, file_entries(detail)
             # a ještě jednou /files z detailu
             files_link2 = safe_get(detail, ["links", "files"]) or safe_get(detail, ["links", "bucket"])
             if files_link2:
-                fc4, bt4 = fetch_files_via_link(session, files_link2)
+                fc4, bt4, entries4 = fetch_files_via_link(session, files_link2)
                 if fc4 is not None or bt4 is not None:
-                    return fc4, bt4, detail
-            return None, None, detail
+                    return fc4, bt4, detail, entries4
+            return None, None, detail, None
         except Exception:
             pass
 
@@ -185,29 +366,71 @@ def fetch_detail_if_needed(session: requests.Session, hit: dict, base_for_detail
             detail = polite_get(session, url).json()
             fc5, bt5 = compute_files_inline_aggregates(detail)
             if (fc5 is not None or bt5 is not None):
-                return fc5, bt5, detail
+                return fc5, bt5, detail, file_entries(detail)
             files_link3 = safe_get(detail, ["links", "files"]) or safe_get(detail, ["links", "bucket"])
             if files_link3:
-                fc6, bt6 = fetch_files_via_link(session, files_link3)
+                fc6, bt6, entries6 = fetch_files_via_link(session, files_link3)
                 if fc6 is not None or bt6 is not None:
-                    return fc6, bt6, detail
-            return None, None, detail
+                    return fc6, bt6, detail, entries6
+            return None, None, detail, None
         except Exception:
             pass
 
-    return None, None, None
+    return None, None, None, None
+
+def enrich_hits(session: requests.Session, hits, base_for_detail: str | None, concurrency: int = 1,
+                known: dict | None = None):
+    """
+    Dopočítá velikosti pro proud hitů omezeným poolem vláken (sdílená session).
+    Vrací (hit, files_count, bytes_total, detail, file_entries) ve stejném pořadí jako vstup;
+    rozpracovaných záznamů je nejvýš `concurrency * 4`.
+    `known` (id -> (files_count, bytes_total, file_entries)) jsou výsledky z checkpointu –
+    pro ně se nic nestahuje.
+    """
+    def resolve(hit):
+        if known:
+            rid = _record_id(hit)
+            if rid in known:
+                fc, bt, entries = known[rid]
+                return fc, bt, None, entries
+        return fetch_detail_if_needed(session, hit, base_for_detail)
+
+    if concurrency <= 1:
+        for hit in hits:
+            yield (hit, *resolve(hit))
+        return
+    window = concurrency * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="enrich") as pool:
+        for hit in hits:
+            pending.append((hit, pool.submit(resolve, hit)))
+            if len(pending) >= window:
+                h, fut = pending.popleft()
+                yield (h, *fut.result())
+        while pending:
+            h, fut = pending.popleft()
+            yield (h, *fut.result())
 
 # ---------- extrakce řádku ----------
 
 def extract_row(hit: dict, fc: int | None, bt: int | None, detail: dict | None):
+    """
+    Plochý řádek pro records_flat.parquet. Extraktory z nrp_extract běží jednou tady,
+    takže reporty už nemusí znovu číst RAW JSON. Detail má přednost, hit je záloha.
+    """
     rec = detail or hit
+    recs = (detail, hit) if detail else (hit,)
+
+    def first(fn):
+        for r in recs:
+            v = fn(r)
+            if v:
+                return v
+        return fn(rec)
+
     rid = rec.get("id") or rec.get("pid") or rec.get("record_id")
     created = rec.get("created") or safe_get(rec, ["metadata", "created"])
     updated = rec.get("updated") or safe_get(rec, ["metadata", "updated"])
-    title = (safe_get(rec, ["metadata", "title"]) or
-             rec.get("title") or
-             safe_get(rec, ["metadata", "titles", 0, "title"]) or
-             rec.get("titles"))
     pub_date = (safe_get(rec, ["metadata", "publication_date"]) or
                 safe_get(rec, ["metadata", "dates", 0, "date"]) or
                 rec.get("publication_date"))
@@ -217,13 +440,351 @@ def extract_row(hit: dict, fc: int | None, bt: int | None, detail: dict | None):
         "id": rid,
         "created": created,
         "updated": updated,
-        "title": title,
+        "title": first(extract_title),
         "publication_date": pub_date,
         "access_status": access_status,
         "files_count": fc,
         "bytes_total": bt,
+        "publication_year": first(lambda r: extract_publication_year(r, fallback=False)),
+        "doi": first(extract_doi),
+        "affiliations": first(extract_affiliation_list),
+        "community": first(extract_community_slug),
+        "community_ids": first(extract_community_ids),
+        "url": extract_ui_url(rec, rid) if rid else None,
     }
 
+# ---------- zápis Parquet ----------
+
+# verze obsahu records_flat (metadata Parquetu); starší Parquet se při --incremental
+# vytěží znovu z RAW úložiště. 2 = publication_year jen z polí s datem publikace
+FLAT_VERSION = "2"
+_FLAT_VERSION_KEY = b"nrp_flat_version"
+
+def _flat_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()),
+        ("created", pa.timestamp("us", tz="UTC")),
+        ("updated", pa.timestamp("us", tz="UTC")),
+        ("title", pa.string()),
+        ("publication_date", pa.string()),
+        ("access_status", pa.dictionary(pa.int32(), pa.string())),
+        ("files_count", pa.int64()),
+        ("bytes_total", pa.int64()),
+        ("publication_year", pa.int32()),
+        ("doi", pa.string()),
+        ("affiliations", pa.list_(pa.string())),
+        ("community", pa.dictionary(pa.int32(), pa.string())),
+        ("community_ids", pa.list_(pa.string())),
+        ("url", pa.string()),
+    ], metadata={_FLAT_VERSION_KEY: FLAT_VERSION.encode()})
+
+def _parse_ts(v):
+    if isinstance(v, datetime):
+        dt = v
+    elif isinstance(v, str) and v:
+        try:
+            dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _parse_int(v):
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        try:
+            f = float(v)
+        except (TypeError, ValueError):
+            return None
+        return int(f) if f == f else None  # NaN → None
+
+def _str_or_none(v):
+    return v if isinstance(v, str) and v else None
+
+def _str_list(v):
+    return [x for x in v if isinstance(x, str)] if isinstance(v, (list, tuple)) else []
+
+def typed_row(row: dict):
+    """Plochý řádek → hodnoty odpovídající _flat_schema() (neplatné hodnoty = null)."""
+    title = row.get("title")
+    pub_date = row.get("publication_date")
+    access = row.get("access_status")
+    return {
+        "id": row.get("id"),
+        "created": _parse_ts(row.get("created")),
+        "updated": _parse_ts(row.get("updated")),
+        "title": title if isinstance(title, str) else None,
+        "publication_date": pub_date if isinstance(pub_date, str) else None,
+        "access_status": access if isinstance(access, str) else None,
+        "files_count": _parse_int(row.get("files_count")),
+        "bytes_total": _parse_int(row.get("bytes_total")),
+        "publication_year": _parse_int(row.get("publication_year")),
+        "doi": _str_or_none(row.get("doi")),
+        "affiliations": _str_list(row.get("affiliations")),
+        "community": _str_or_none(row.get("community")),
+        "community_ids": _str_list(row.get("community_ids")),
+        "url": _str_or_none(row.get("url")),
+    }
+
+def _files_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("record_id", pa.string()),
+        ("key", pa.string()),
+        ("size", pa.int64()),
+        ("checksum", pa.string()),
+        ("mimetype", pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+class ParquetBatchWriter:
+    """
+    Zapisuje řádky do Parquetu po dávkách přes pyarrow.ParquetWriter,
+    takže paměť nezávisí na počtu záznamů. Píše do dočasného souboru
+    a na konci ho atomicky přejmenuje.
+    """
+
+    def __init__(self, path: str, schema, batch_size: int = 1000):
+        import pyarrow.parquet as pq
+        self.path = path
+        self.batch_size = batch_size
+        self.schema = schema
+        self._tmp = path + ".tmp"
+        self._writer = pq.ParquetWriter(self._tmp, self.schema)
+        self._buf = []
+        self.rows = 0
+        # po pádu nenecháme ležet rozepsaný .tmp (--resume Parquet stejně staví znovu ze spoolu)
+        atexit.register(self._discard)
+
+    def _discard(self):
+        if os.path.exists(self._tmp):
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            os.remove(self._tmp)
+
+    def _append(self, row: dict):
+        self._buf.append(row)
+        self.rows += 1
+        if len(self._buf) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        if self._buf:
+            self._writer.write_batch(pa.RecordBatch.from_pylist(self._buf, schema=self.schema))
+            self._buf = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+class FlatWriter(ParquetBatchWriter):
+    """
+    records_flat.parquet; průběžně sčítá souhrnné počty a (je-li zadaný)
+    plní kvantilový sketch velikostí.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000, sketch: SizeSketch | None = None):
+        super().__init__(path, _flat_schema(), batch_size)
+        self.with_sizes = 0
+        self.total_bytes = 0
+        self.total_files = 0
+        self.sketch = sketch
+
+    def write(self, row: dict):
+        r = typed_row(row)
+        if _has_size(r["files_count"], r["bytes_total"]):
+            self.with_sizes += 1
+        self.total_bytes += r["bytes_total"] or 0
+        self.total_files += r["files_count"] or 0
+        if self.sketch is not None:
+            self.sketch.add(r["bytes_total"])
+        self._append(r)
+
+class FilesWriter(ParquetBatchWriter):
+    """
+    files.parquet – manifest souborů: jeden řádek na soubor (record_id, key, size, checksum, mimetype).
+    Záznamy se soubory, ke kterým se seznam nepodařilo získat (chyba endpointu, agregát bez
+    `entries`), v manifestu řádky nemají – drží se v `unlisted` (id -> updated), viz UNLISTED_NAME.
+    """
+
+    def __init__(self, path: str, batch_size: int = 5000):
+        super().__init__(path, _files_schema(), batch_size)
+        self.unlisted = {}
+
+    def write(self, rid: str, entries, files_count=None, updated=None):
+        if not entries and (_parse_int(files_count) or 0) > 0:
+            self.unlisted[rid] = updated
+        for e in entries or ():
+            self._append({"record_id": rid, "key": e.get("key"), "size": _parse_int(e.get("size")),
+                          "checksum": e.get("checksum"), "mimetype": e.get("mimetype")})
+
+def load_unlisted(path: str) -> dict:
+    """id -> updated záznamů, jejichž seznam souborů se minule nepodařilo získat."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_unlisted(unlisted: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(unlisted.items())), f, indent=1)
+        f.write("\n")
+
+def load_file_manifest(path: str):
+    """Předchozí files.parquet jako id -> [položky]; None, pokud neexistuje."""
+    if not os.path.exists(path):
+        return None
+    import pyarrow.parquet as pq
+    out = {}
+    for r in pq.read_table(path).to_pylist():
+        out.setdefault(r.pop("record_id"), []).append(r)
+    return out
+
+# ---------- inkrementální režim ----------
+
+def load_previous_state(raw_dir: str, flat_parquet: str, details_dir: str | None = None):
+    """
+    Načte předchozí sklizeň: (RawStore, id -> plochý řádek v původním pořadí).
+    Pokud něco chybí, vrací (None, None). Chybí-li v Parquetu sloupce současného
+    schématu nebo je starší FLAT_VERSION, řádky se znovu vytěží z RAW hitů a uložených detailů –
+    velikosti se přitom převezmou, takže se nic nestahuje.
+    """
+    if not (RawStore.exists(raw_dir) and os.path.exists(flat_parquet)):
+        return None, None
+    import pyarrow.parquet as pq
+    raw = RawStore(raw_dir)
+    flat = {r["id"]: r for r in pq.read_table(flat_parquet).to_pylist() if r.get("id")}
+    schema = pq.read_schema(flat_parquet)
+    missing = set(_flat_schema().names) - set(schema.names)
+    version = (schema.metadata or {}).get(_FLAT_VERSION_KEY, b"1").decode()
+    if missing or version != FLAT_VERSION:
+        reason = f"new columns: {', '.join(sorted(missing))}" if missing else f"format {version} → {FLAT_VERSION}"
+        print(f"[i] Upgrading flat rows ({reason})", file=sys.stderr)
+        details = RawStore(details_dir) if details_dir and RawStore.exists(details_dir) else None
+        for hit in raw:
+            rid = _record_id(hit)
+            if rid not in flat:
+                continue
+            detail = None
+            if details is not None and rid in details and details.updated(rid) == hit.get("updated"):
+                detail = details.get(rid)
+            old = flat[rid]
+            flat[rid] = extract_row(hit, _parse_int(old.get("files_count")), _parse_int(old.get("bytes_total")),
+                                    detail)
+    return raw, flat
+
+def high_water_mark(flat_rows: dict):
+    """Nejvyšší `updated` z předchozí sklizně jako ISO řetězec (UTC)."""
+    vals = [ts for ts in (_parse_ts(r.get("updated")) for r in flat_rows.values()) if ts is not None]
+    return max(vals).isoformat() if vals else None
+
+def merge_incremental(prev_ids: list, prev_flat: dict, changed: list, live_ids: set | None):
+    """
+    Sloučí změněné záznamy (seznam (hit, flat_row)) do předchozího stavu podle `id`.
+    Změněné existující záznamy zůstávají na svém místě, nové jdou na začátek
+    (nejnovější první, jako ve výchozím výpisu). `live_ids` (pokud je k dispozici)
+    odfiltruje záznamy, které v repozitáři už nejsou.
+    Vrací seznam (id, hit, flat_row); hit je None u nezměněných záznamů
+    (jejich komprimovaný RAW se jen zkopíruje z předchozího úložiště).
+    """
+    changed_by_id = {}
+    for hit, row in changed:
+        changed_by_id[row["id"]] = (row["id"], hit, row)
+    prev = set(prev_ids)
+    new = [v for rid, v in changed_by_id.items() if rid not in prev]
+    new.sort(key=lambda v: _parse_ts(v[2].get("created")) or datetime.min.replace(tzinfo=timezone.utc),
+             reverse=True)
+    merged = list(new)
+    for rid in prev_ids:
+        if rid in changed_by_id:
+            merged.append(changed_by_id[rid])
+        elif rid in prev_flat:
+            merged.append((rid, None, prev_flat[rid]))
+    if live_ids is not None:
+        merged = [v for v in merged if v[0] in live_ids]
+    return merged
+
+def _sketch_matches(sketch: SizeSketch, rows) -> bool:
+    """Popisuje sketch právě tyto řádky? (počet a součet velikostí se drží přesně)"""
+    sizes = [b for b in (_parse_int(r.get("bytes_total")) for r in rows) if b is not None]
+    return sketch.count == len(sizes) and sketch.sum == sum(sizes)
+
+def update_sketch(sketch: SizeSketch, prev_flat: dict, merged: list):
+    """
+    Převede sketch minulého běhu na sloučený stav z merge_incremental(): odečte staré
+    velikosti změněných a smazaných záznamů a přičte nové; nezměněných se nedotkne.
+    """
+    kept = set()
+    for rid, hit, row in merged:
+        kept.add(rid)
+        if hit is None:
+            continue
+        if rid in prev_flat:
+            sketch.remove(_parse_int(prev_flat[rid].get("bytes_total")))
+        sketch.add(_parse_int(row.get("bytes_total")))
+    for rid, row in prev_flat.items():
+        if rid not in kept:
+            sketch.remove(_parse_int(row.get("bytes_total")))
+
+def keep_detail(details: RawStoreWriter, prev: RawStore | None, hit: dict, detail: dict | None):
+    """
+    Uloží stažený detail do úložiště detailů; pokud se detail nestahoval, převezme
+    ten z minulého běhu – ale jen když sedí `updated` (jinak je zastaralý).
+    """
+    rid = _record_id(hit)
+    if not rid:
+        return
+    if detail:
+        details.add_blob(rid, encode_record(detail), detail.get("updated") or hit.get("updated"))
+    elif rid not in details and prev is not None and rid in prev and prev.updated(rid) == hit.get("updated"):
+        details.add_blob(rid, prev.get_blob(rid), prev.updated(rid))
+
+def _has_size(fc, bt):
+    return bool(fc) or bool(bt)
+
+# ---------- checkpointy (--resume) ----------
+
+CHECKPOINT_NAME = ".harvest_checkpoint.json"
+ENRICHED_NAME = ".harvest_enriched.jsonl"
+# záznamy se soubory bez řádků v files.parquet: seznam se znovu zkouší jen po změně `updated`
+UNLISTED_NAME = "files_unlisted.json"
+
+def save_checkpoint(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def load_checkpoint(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_enriched(path: str):
+    """Sidecar s už dopočtenými velikostmi: id -> (files_count, bytes_total, file_entries)."""
+    known = {}
+    if not os.path.exists(path):
+        return known
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                break  # useknutý poslední řádek po pádu
+            known[e["id"]] = (e.get("files_count"), e.get("bytes_total"), e.get("files"))
+    return known
+
 # ---------- main ----------
 
 def main():
@@ -233,15 +794,49 @@ def main():
     ap.add_argument("--page-size", type=int, default=100, help="Requested page size if not present in URL")
     ap.add_argument("--max-records", type=int, default=None, help="Limit for testing")
     ap.add_argument("--token", default=os.getenv("NRP_TOKEN"), help="Bearer token (optional)")
-    ap.add_argument("--no-duckdb", action="store_true", help="Skip DuckDB creation")
+    ap.add_argument("--concurrency", type=int, default=8, help="Parallel size/detail requests (default: %(default)s)")
+    ap.add_argument("--engine", choices=("threads", "async"), default="threads",
+                    help="HTTP engine for listing + size lookups; 'async' needs httpx (default: %(default)s)")
+    ap.add_argument("--shard-size", type=int, default=0,
+                    help="Split the listing into created-date windows of at most N records and page them "
+                         "concurrently (0 = serial links.next listing, default)")
+    ap.add_argument("--rate", type=float, default=float(os.getenv("NRP_RATE") or 10),
+                    help="Initial request rate in req/s, adapted from 429s and latency (default: %(default)s)")
+    ap.add_argument("--max-rate", type=float, default=float(os.getenv("NRP_MAX_RATE") or 50),
+                    help="Upper bound for the adaptive request rate (default: %(default)s)")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true",
+                      help="Fetch only records updated since the previous harvest in --out and merge them by id")
+    mode.add_argument("--resume", action="store_true",
+                      help="Continue an interrupted full harvest from its last checkpoint in --out")
+    ap.add_argument("--http-cache", default=None,
+                    help="SQLite HTTP response cache (default: $NRP_HTTP_CACHE or .http_cache/http.sqlite)")
+    ap.add_argument("--cache-ttl", type=float, default=None,
+                    help="Seconds a cached response is reused without revalidation (default: $NRP_HTTP_CACHE_TTL or 0)")
+    ap.add_argument("--no-http-cache", action="store_true", help="Disable the HTTP response cache")
+    ap.add_argument("--no-duckdb", action="store_true", help="Skip refreshing nrp.duckdb (tables + summary tables, see nrp_db.py)")
     args = ap.parse_args()
+    if args.shard_size and args.engine != "threads":
+        ap.error("--shard-size requires --engine threads")
+    if args.shard_size and args.resume:
+        ap.error("--shard-size cannot be combined with --resume (there is no single pagination cursor)")
 
     os.makedirs(args.out, exist_ok=True)
-    raw_path = os.path.join(args.out, "records.jsonl")
+    raw_dir = os.path.join(args.out, "raw")
+    details_dir = os.path.join(args.out, "details")
+    legacy_jsonl = os.path.join(args.out, "records.jsonl")
     flat_parquet = os.path.join(args.out, "records_flat.parquet")
+    files_parquet = os.path.join(args.out, "files.parquet")
     duckdb_path = os.path.join(args.out, "nrp.duckdb")
+    sketch_path = os.path.join(args.out, SKETCH_NAME)
+    unlisted_path = os.path.join(args.out, UNLISTED_NAME)
 
-    s = get_session(args.token)
+    cache = None if args.no_http_cache else default_cache(args.http_cache, ttl=args.cache_ttl)
+    limiter = AdaptiveRateLimiter(rate=args.rate, max_rate=args.max_rate)
+    # pool spojení pro vlákna dopočtu i výpisu, které běží souběžně
+    # (souběžná okna s --shard-size, jinak jedno vlákno prefetch())
+    listing_threads = max(args.concurrency, 1) if args.shard_size else 1
+    s = get_session(args.token, pool_size=max(args.concurrency, 1) + listing_threads, cache=cache, limiter=limiter)
     print(f"[i] Start URL: {args.url}", file=sys.stderr)
 
     base_for_detail = None
@@ -250,55 +845,204 @@ def main():
     elif "/datasets/all" in args.url:
         base_for_detail = args.url.split("/datasets/all")[0] + "/datasets/"
 
-    # Harvest RAW
+    def enriched_listing(url, limit, known=None, on_page=None):
+        """Výpis od `url` + dopočet velikostí → (hit, files_count, bytes_total, detail, files) v pořadí výpisu."""
+        if args.engine == "async":
+            from harvest_async import enrich_listing
+            return enrich_listing(url, base_for_detail, page_size=args.page_size, max_records=limit,
+                                  concurrency=args.concurrency, token=args.token, cache=cache, limiter=limiter,
+                                  known=known, on_page=on_page)
+        if args.shard_size and url == args.url:
+            pages = iter_datasets_sharded(s, url, args.page_size, limit, args.shard_size, args.concurrency)
+        else:
+            pages = iter_datasets(s, url, page_size=args.page_size, max_records=limit, on_page=on_page)
+        listing = prefetch(pages, maxsize=2 * args.page_size)
+        return enrich_hits(s, listing, base_for_detail, args.concurrency, known=known)
+
+    prev_raw = prev_flat = None
+    start_url = args.url
+    if args.incremental:
+        if not RawStore.exists(raw_dir) and os.path.exists(legacy_jsonl):
+            print(f"[i] Converting {legacy_jsonl} → {raw_dir}", file=sys.stderr)
+            import_jsonl(legacy_jsonl, raw_dir)
+        prev_raw, prev_flat = load_previous_state(raw_dir, flat_parquet, details_dir)
+        since = high_water_mark(prev_flat) if prev_flat else None
+        if since is None:
+            print("[!] No previous harvest found – falling back to a full harvest", file=sys.stderr)
+            prev_raw = prev_flat = None
+        else:
+            start_url = updated_since_url(args.url, since, args.page_size)
+            print(f"[i] Incremental: records updated since {since}", file=sys.stderr)
+
+    # Harvest RAW + dopočet velikostí v jednom proudu:
+    # výpis stránek běží na pozadí, hity jdou rovnou do poolu a hotové řádky
+    # (ve vstupním pořadí) se zapisují do RAW úložiště i po dávkách do Parquetu;
+    # seznamy souborů, které se při dopočtu stáhly, jdou do manifestu files.parquet.
+    prev_files = load_file_manifest(files_parquet) if prev_raw is not None else None
+    # sketch velikostí: při --incremental se převezme minulý a jen se do něj promítnou změny,
+    # jinak (nebo když k minulému Parquetu nesedí) se staví z proudu zapisovaných řádků
+    prev_sketch = load_sketch(sketch_path) if prev_raw is not None else None
+    if prev_sketch is not None and not _sketch_matches(prev_sketch, prev_flat.values()):
+        print(f"[i] {sketch_path} does not match the previous harvest – rebuilding", file=sys.stderr)
+        prev_sketch = None
+    flat = FlatWriter(flat_parquet, sketch=SizeSketch() if prev_sketch is None else None)
+    files_out = FilesWriter(files_parquet)
+    # stažené detaily si necháváme (klíč id + updated) pro další kroky, např. top10_datasets.py
+    prev_details = RawStore(details_dir) if RawStore.exists(details_dir) else None
     n = 0
-    with open(raw_path, "w", encoding="utf-8") as f:
-        for hit in iter_datasets(s, args.url, page_size=args.page_size, max_records=args.max_records):
-            f.write(json.dumps(hit, ensure_ascii=False) + "\n")
-            n += 1
-            if n % 1000 == 0:
-                print(f"[i] harvested: {n}", file=sys.stderr)
-    print(f"[✓] Harvested {n} hits → {raw_path}", file=sys.stderr)
-
-    # Flatten + dopočet velikostí
-    import pandas as pd
-    rows = []
-    got_sizes = 0
-    with open(raw_path, "r", encoding="utf-8") as f:
-        for line in f:
-            hit = json.loads(line)
-            fc, bt, detail = fetch_detail_if_needed(s, hit, base_for_detail)
-            if (fc is not None and fc != 0) or (bt is not None and bt != 0):
-                got_sizes += 1
-            rows.append(extract_row(hit, fc, bt, detail))
-
-    df = pd.DataFrame(rows)
-    if "publication_date" in df.columns:
-        df["publication_year"] = pd.to_datetime(df["publication_date"], errors="coerce").dt.year
-    if "bytes_total" in df.columns:
-        df["bytes_total"] = pd.to_numeric(df["bytes_total"], errors="coerce")
-    if "files_count" in df.columns:
-        df["files_count"] = pd.to_numeric(df["files_count"], errors="coerce")
-
-    df.to_parquet(flat_parquet, index=False)
+    if prev_raw is None:
+        # checkpoint po každé zapsané stránce: kurzor `links.next` + stav spoolu RAW úložiště;
+        # sidecar drží dopočtené velikosti, aby je --resume nemusel stahovat znovu
+        ckpt_path = os.path.join(args.out, CHECKPOINT_NAME)
+        enriched_path = os.path.join(args.out, ENRICHED_NAME)
+        state = load_checkpoint(ckpt_path) if args.resume else None
+        if state is not None and "raw" not in state:
+            state = None  # checkpoint ze starší verze (records.jsonl)
+        known = {}
+        side_mode = "w"
+        if args.resume and state is None:
+            print("[!] No checkpoint found – starting from the first page", file=sys.stderr)
+        if state is None and os.path.exists(ckpt_path):
+            os.remove(ckpt_path)  # checkpoint jiného běhu k novému spoolu nepatří
+        if args.shard_size:
+            print("[i] Sharded listing writes no resume checkpoints", file=sys.stderr)
+        raw = RawStoreWriter(raw_dir, resume=state["raw"] if state else None)
+        details = RawStoreWriter(details_dir, resume=state.get("details") if state else None)
+        if state is not None:
+            known = load_enriched(enriched_path)
+            for hit, fc, bt, detail, entries in enrich_hits(s, raw.iter_spooled(), base_for_detail,
+                                                            args.concurrency, known=known):
+                keep_detail(details, prev_details, hit, detail)
+                files_out.write(_record_id(hit), entries, fc, hit.get("updated"))
+                flat.write(extract_row(hit, fc, bt, detail))
+            n = flat.rows
+            start_url = state["next"]
+            side_mode = "a"
+            print(f"[i] Resuming after {n} records", file=sys.stderr)
+
+        # `pos` = pozice ve výpisu, `pages` = konce stránek (pos, kurzor další stránky).
+        # on_page přichází z vlákna výpisu a může se opozdit za zápisem, takže stav spoolu
+        # v checkpointu může obsahovat pár hitů za hranicí stránky – po --resume se pak
+        # při opětovném výpisu od kurzoru přeskočí (už jsou ve spoolu).
+        pos = state.get("pos", n) if state else n
+        limit = args.max_records - pos if args.max_records else None
+        if start_url and (limit is None or limit > 0):
+            pages = deque()
+            pos0 = pos
+            enriched = enriched_listing(start_url, limit, known=known,
+                                        on_page=lambda seen, nxt: pages.append((pos0 + seen, nxt)))
+            with open(enriched_path, side_mode, encoding="utf-8") as done:
+                for hit, fc, bt, detail, entries in enriched:
+                    pos += 1
+                    if state is not None and _record_id(hit) in raw:
+                        continue
+                    raw.add(hit)
+                    keep_detail(details, prev_details, hit, detail)
+                    files_out.write(_record_id(hit), entries, fc, hit.get("updated"))
+                    done.write(json.dumps({"id": _record_id(hit), "files_count": fc, "bytes_total": bt,
+                                           "files": entries}, ensure_ascii=False) + "\n")
+                    n += 1
+                    if n % 1000 == 0:
+                        print(f"[i] harvested: {n}", file=sys.stderr)
+                    flat.write(extract_row(hit, fc, bt, detail))
+                    while pages and pages[0][0] <= pos:
+                        boundary, next_url = pages.popleft()
+                        done.flush()
+                        save_checkpoint(ckpt_path, {"next": next_url, "raw": raw.state(),
+                                                    "details": details.state(), "n": n, "pos": boundary})
+        raw.close()
+        details.close()
+        print(f"[✓] Harvested {n} hits → {raw_dir}", file=sys.stderr)
+    else:
+        changed = []
+        changed_details = {}
+        changed_files = {}
+        for hit, fc, bt, detail, entries in enriched_listing(start_url, args.max_records):
+            changed.append((hit, extract_row(hit, fc, bt, detail)))
+            changed_details[_record_id(hit)] = detail
+            changed_files[_record_id(hit)] = entries
+        print(f"[i] Changed since last harvest: {len(changed)}", file=sys.stderr)
+        # smazané záznamy: sloučený stav má víc id, než kolik jich API hlásí
+        # → teprve pak projdeme výpis (bez dopočtu velikostí) a id porovnáme
+        live_ids = None
+        total = fetch_total(s, args.url)
+        known_count = len(set(prev_raw.ids()) | {row["id"] for _, row in changed})
+        if total is not None and known_count > total:
+            if args.shard_size:
+                ids = iter_datasets_sharded(s, args.url, args.page_size, None, args.shard_size, args.concurrency)
+            else:
+                ids = iter_datasets(s, args.url, page_size=args.page_size, max_records=None)
+            live_ids = {_record_id(h) for h in ids}
+        elif total is not None and known_count < total:
+            print(f"[!] API reports {total} records but only {known_count} are known – run a full harvest",
+                  file=sys.stderr)
+        merged = merge_incremental(prev_raw.ids(), prev_flat, changed, live_ids)
+        if live_ids is not None:
+            print(f"[i] Reconciled ids: {known_count - len(merged)} removed", file=sys.stderr)
+        if prev_sketch is not None:
+            update_sketch(prev_sketch, prev_flat, merged)
+        # nezměněné záznamy se soubory, které v manifestu chybí (první běh s files.parquet):
+        # seznam souborů se jednorázově dotáhne, velikosti v Parquetu zůstávají; kde se to
+        # už jednou nepovedlo (UNLISTED_NAME), zkusí se znovu až po změně záznamu
+        prev_files = prev_files or {}
+        prev_unlisted = load_unlisted(unlisted_path)
+        missing = [rid for rid, hit, row in merged
+                   if hit is None and rid not in prev_files and (_parse_int(row.get("files_count")) or 0) > 0
+                   and (rid not in prev_unlisted or prev_unlisted[rid] != prev_raw.updated(rid))]
+        if missing:
+            print(f"[i] Fetching file lists missing from {files_parquet}: {len(missing)}", file=sys.stderr)
+            hits = (prev_raw.get(rid) for rid in missing)
+            for hit, _, _, _, entries in enrich_hits(s, hits, base_for_detail, args.concurrency):
+                prev_files[_record_id(hit)] = entries
+        raw = RawStoreWriter(raw_dir, segments=prev_raw.segments)
+        details = RawStoreWriter(details_dir)
+        for rid, hit, row in merged:
+            if hit is None:
+                raw.add_blob(rid, prev_raw.get_blob(rid), prev_raw.updated(rid))
+                if prev_details is not None and rid in prev_details:
+                    details.add_blob(rid, prev_details.get_blob(rid), prev_details.updated(rid))
+                files_out.write(rid, prev_files.get(rid), row.get("files_count"), prev_raw.updated(rid))
+            else:
+                raw.add(hit)
+                keep_detail(details, prev_details, hit, changed_details.get(rid))
+                files_out.write(rid, changed_files.get(rid), row.get("files_count"), hit.get("updated"))
+            flat.write(row)
+        raw.close()
+        details.close()
+        n = flat.rows
+        print(f"[✓] Merged {n} hits → {raw_dir}", file=sys.stderr)
+    flat.close()
+    files_out.close()
     print(f"[✓] Flattened view → {flat_parquet}", file=sys.stderr)
+    print(f"[✓] File manifest → {files_parquet} ({files_out.rows} files)", file=sys.stderr)
+    save_unlisted(files_out.unlisted, unlisted_path)
+    if files_out.unlisted:
+        print(f"[i] Records with files but no file list: {len(files_out.unlisted)} → {unlisted_path}",
+              file=sys.stderr)
+    sketch = prev_sketch if prev_sketch is not None else flat.sketch
+    save_sketch(sketch, sketch_path)
+    q = [sketch.quantile(p) for p in (0.5, 0.9, 0.99)]
+    print(f"[✓] Size sketch → {sketch_path}"
+          + (f" (p50 ≈ {q[0]:,.0f} B, p90 ≈ {q[1]:,.0f} B, p99 ≈ {q[2]:,.0f} B)" if sketch.count else ""),
+          file=sys.stderr)
+
+    # sklizeň doběhla – checkpointy (a records.jsonl ze staršího formátu) už nejsou potřeba
+    for name in (CHECKPOINT_NAME, ENRICHED_NAME, "records.jsonl"):
+        path = os.path.join(args.out, name)
+        if os.path.exists(path):
+            os.remove(path)
 
     if not args.no_duckdb:
         import duckdb
+        import nrp_db
         con = duckdb.connect(duckdb_path)
-        con.execute("INSTALL parquet; LOAD parquet;")
-        con.execute("CREATE OR REPLACE TABLE records_flat AS SELECT * FROM parquet_scan(?)", [flat_parquet])
+        nrp_db.refresh(con, args.out)
         con.close()
         print(f"[✓] DuckDB database → {duckdb_path}", file=sys.stderr)
 
-    try:
-        total_bytes = int(df["bytes_total"].fillna(0).sum())
-        total_files = int(df["files_count"].fillna(0).sum())
-        print(f"[i] Records with computed sizes: {got_sizes}/{len(df)}", file=sys.stderr)
-        print(f"[i] Total bytes (sum over records): {total_bytes:,}", file=sys.stderr)
-        print(f"[i] Total files (sum over records): {total_files:,}", file=sys.stderr)
-    except Exception:
-        pass
+    print(f"[i] Records with computed sizes: {flat.with_sizes}/{flat.rows}", file=sys.stderr)
+    print(f"[i] Total bytes (sum over records): {flat.total_bytes:,}", file=sys.stderr)
+    print(f"[i] Total files (sum over records): {flat.total_files:,}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Analytická vrstva nad DuckDB (nrp_dump/nrp.duckdb).
+
+Tabulky records_flat / files se načítají z Parquetů harvestu a k nim se hned
+počítají malé souhrnné tabulky, ze kterých čtou reporty (datasets-volume-graphs.py,
+top10_datasets.py) místo vlastního čtení celého Parquetu:
+
+  size_stats        – počet, součet, průměr, medián, p90, p99, min, max
+                      (populace 'with_size' = známá velikost, 'positive' = velikost > 0)
+  quarterly_counts  – počet záznamů po čtvrtletích publikace (souvislá řada, díry = 0)
+  size_histogram    – histogram kladných velikostí v logaritmických koších
+  size_cdf          – CDF kladných velikostí zhuštěná na CDF_POINTS kvantilových bodů
+  top_records       – TOP_K největších záznamů podle bytes_total s pořadím
+
+Obnova je přírůstková na úrovni zdrojů: otisk Parquetu (velikost + mtime) se ukládá
+do tabulky _sources a při shodě se nic nepřepočítává.
+
+Použití:
+  python nrp_db.py [--out nrp_dump] [--force]   – obnoví databázi a vypíše souhrn
+"""
+import argparse
+import sys
+import threading
+from pathlib import Path
+
+import duckdb
+
+OUT_DIR = Path("nrp_dump")
+DB_NAME = "nrp.duckdb"
+SOURCES = {"records_flat": "records_flat.parquet", "files": "files.parquet"}
+SUMMARY_TABLES = ("size_stats", "quarterly_counts", "size_histogram", "size_cdf", "top_records")
+TOP_K = 100
+HIST_BINS = 50
+# body CDF rovnoměrně v kumulativním podílu → svislá odchylka od empirické CDF
+# nejvýš 1/(CDF_POINTS − 1) + 1/n, nezávisle na počtu záznamů
+CDF_POINTS = 201
+
+# datum publikace: ISO datum/čas, jinak rok-měsíc nebo rok
+PUB_TS = ("coalesce(try_cast(publication_date AS TIMESTAMP), try_strptime(publication_date, '%Y-%m'), "
+          "try_strptime(publication_date, '%Y'))")
+BYTES = "try_cast(bytes_total AS BIGINT)"
+
+
+def _fingerprint(path: Path) -> str | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def columns(con, table: str) -> list[str]:
+    return [r[0] for r in con.execute(f"DESCRIBE {table}").fetchall()]
+
+
+def _build_summaries(con):
+    con.execute(f"""
+        CREATE OR REPLACE TABLE size_stats AS
+        WITH s AS (SELECT {BYTES} AS b FROM records_flat)
+        SELECT 'with_size' AS population, count(b) AS n, sum(b) AS total, avg(b) AS mean,
+               quantile_cont(b, 0.5) AS median, quantile_cont(b, 0.9) AS p90, quantile_cont(b, 0.99) AS p99,
+               min(b) AS min, max(b) AS max
+        FROM s WHERE b IS NOT NULL
+        UNION ALL
+        SELECT 'positive', count(b), sum(b), avg(b), quantile_cont(b, 0.5), quantile_cont(b, 0.9),
+               quantile_cont(b, 0.99), min(b), max(b)
+        FROM s WHERE b > 0
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE quarterly_counts AS
+        WITH q AS (
+            SELECT year(ts) * 4 + quarter(ts) - 1 AS qi FROM (SELECT {PUB_TS} AS ts FROM records_flat)
+            WHERE ts IS NOT NULL
+        ),
+        c AS (SELECT qi, count(*) AS n FROM q GROUP BY qi),
+        r AS (SELECT unnest(range(min(qi), max(qi) + 1)) AS qi FROM c)
+        SELECT r.qi // 4 AS year, r.qi % 4 + 1 AS quarter,
+               format('{{}} Q{{}}', r.qi // 4, r.qi % 4 + 1) AS label, coalesce(c.n, 0) AS count
+        FROM r LEFT JOIN c USING (qi)
+        ORDER BY r.qi
+    """)
+    # koše rovnoměrné v log měřítku mezi min a max (jako np.geomspace(min, max, HIST_BINS))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE size_histogram AS
+        WITH s AS (SELECT {BYTES}::DOUBLE AS b FROM records_flat WHERE {BYTES} > 0),
+        m AS (SELECT min(b) AS lo, max(b) AS hi FROM s),
+        k AS (
+            SELECT CASE WHEN m.hi = m.lo THEN 0
+                        ELSE least(floor(ln(s.b / m.lo) / ln(m.hi / m.lo) * {HIST_BINS - 1}), {HIST_BINS - 2})
+                   END::INTEGER AS bin
+            FROM s, m
+        ),
+        edges AS (
+            SELECT i AS bin,
+                   m.lo * pow(m.hi / m.lo, i / {HIST_BINS - 1}) AS lo,
+                   m.lo * pow(m.hi / m.lo, (i + 1) / {HIST_BINS - 1}) AS hi
+            FROM m, range({HIST_BINS - 1}) t(i)
+            WHERE m.lo IS NOT NULL
+        )
+        SELECT edges.bin, edges.lo, edges.hi, coalesce(c.n, 0) AS count
+        FROM edges LEFT JOIN (SELECT bin, count(*) AS n FROM k GROUP BY bin) c USING (bin)
+        ORDER BY edges.bin
+    """)
+    fractions = ", ".join(repr(i / (CDF_POINTS - 1)) for i in range(CDF_POINTS))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE size_cdf AS
+        SELECT * FROM (
+            SELECT unnest([{fractions}]) AS fraction,
+                   unnest(quantile_cont(b, [{fractions}])) AS bytes
+            FROM (SELECT {BYTES}::DOUBLE AS b FROM records_flat WHERE {BYTES} > 0)
+        ) WHERE bytes IS NOT NULL
+        ORDER BY fraction
+    """)
+    cols = set(columns(con, "records_flat"))
+    extra = [c for c in ("title", "files_count", "publication_year", "doi", "affiliations", "community", "url")
+             if c in cols]
+    select = ", ".join(["id", f"{BYTES} AS bytes_total", *extra])
+    con.execute(f"""
+        CREATE OR REPLACE TABLE top_records AS
+        SELECT row_number() OVER (ORDER BY bytes_total DESC, id) AS rank, *
+        FROM (SELECT {select} FROM records_flat) WHERE bytes_total IS NOT NULL
+        ORDER BY bytes_total DESC, id
+        LIMIT {TOP_K}
+    """)
+
+
+def refresh(con, out_dir=OUT_DIR, force: bool = False) -> bool:
+    """
+    Načte změněné Parquety do tabulek a přepočte souhrny. Vrací True, pokud se něco měnilo.
+    Chybějící files.parquet se přeskočí; chybějící records_flat.parquet je chyba.
+    """
+    out_dir = Path(out_dir)
+    con.execute("CREATE TABLE IF NOT EXISTS _sources (name VARCHAR PRIMARY KEY, fingerprint VARCHAR)")
+    stored = dict(con.execute("SELECT name, fingerprint FROM _sources").fetchall())
+    changed = False
+    for table, fname in SOURCES.items():
+        path = out_dir / fname
+        fp = _fingerprint(path)
+        if fp is None:
+            if table == "records_flat":
+                raise FileNotFoundError(path)
+            continue
+        if not force and stored.get(table) == fp:
+            continue
+        con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM read_parquet(?)", [str(path)])
+        con.execute("INSERT OR REPLACE INTO _sources VALUES (?, ?)", [table, fp])
+        changed = True
+    if changed or not all(_has_table(con, t) for t in SUMMARY_TABLES):
+        _build_summaries(con)
+        changed = True
+    return changed
+
+
+def _has_table(con, name: str) -> bool:
+    return con.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]).fetchone()[0] > 0
+
+
+_con = None
+_con_lock = threading.Lock()
+
+
+def get_connection(out_dir=OUT_DIR):
+    """Sdílené spojení procesu (databáze obnovená při prvním použití); vlákna si berou cursor()."""
+    global _con
+    with _con_lock:
+        if _con is None:
+            con = duckdb.connect(str(Path(out_dir) / DB_NAME))
+            refresh(con, out_dir)
+            _con = con
+        return _con.cursor()
+
+
+def size_stats(population: str = "with_size", con=None) -> dict:
+    con = con or get_connection()
+    df = con.execute("SELECT * FROM size_stats WHERE population = ?", [population]).df()
+    return df.iloc[0].to_dict()
+
+
+def quarterly_counts(con=None):
+    con = con or get_connection()
+    return con.execute("SELECT year, quarter, label, count FROM quarterly_counts ORDER BY year, quarter").df()
+
+
+def size_histogram(con=None):
+    con = con or get_connection()
+    return con.execute("SELECT bin, lo, hi, count FROM size_histogram ORDER BY bin").df()
+
+
+def top_records(k: int = 10, con=None):
+    con = con or get_connection()
+    if k > TOP_K:
+        raise ValueError(f"top_records keeps only the top {TOP_K}")
+    return con.execute("SELECT * FROM top_records WHERE rank <= ? ORDER BY rank", [k]).df()
+
+
+def records(names, con=None):
+    """Vybrané sloupce records_flat (ty, které tabulka má) jako DataFrame."""
+    con = con or get_connection()
+    available = set(columns(con, "records_flat"))
+    cols = [c for c in names if c in available]
+    return con.execute(f"SELECT {', '.join(cols)} FROM records_flat").df()
+
+
+def size_cdf(con=None):
+    con = con or get_connection()
+    return con.execute("SELECT fraction, bytes FROM size_cdf ORDER BY fraction").df()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Refresh nrp.duckdb and its summary tables from the harvested Parquet.")
+    ap.add_argument("--out", default=str(OUT_DIR), help="Harvest output folder (default: %(default)s)")
+    ap.add_argument("--force", action="store_true", help="Reload the Parquet files even if unchanged")
+    args = ap.parse_args()
+    db_path = Path(args.out) / DB_NAME
+    con = duckdb.connect(str(db_path))
+    changed = refresh(con, args.out, force=args.force)
+    print(f"[✓] DuckDB database → {db_path}" + ("" if changed else " (up to date)"), file=sys.stderr)
+    st = size_stats(con=con)
+    print(f"[i] Records with size: {int(st['n']):,}, total bytes: {int(st['total'] or 0):,}", file=sys.stderr)
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Sdílené extraktory polí z InvenioRDM záznamů (RAW hit nebo detail z API).
+
+Používá je harvest_nrp.py při plochém zápisu (sloupce records_flat.parquet)
+i skripty, které ještě pracují s JSONem (top10_datasets.py, topk.py).
+Všechny funkce jsou tolerantní ke struktuře: chybějící pole = None / [].
+"""
+import re
+from datetime import datetime
+
+BASE_URL = "https://datarepo.eosc.cz"
+
+def safe_get(d, path, default=None):
+    cur = d
+    for p in path:
+        if isinstance(cur, dict) and p in cur:
+            cur = cur[p]
+        else:
+            return default
+    return cur
+
+def normalize_doi(s: str | None) -> str | None:
+    """Vrátí „holé“ 10.xxxx/... pokud najde, a očistí běžné prefixy."""
+    if not s:
+        return None
+    s2 = str(s).strip()
+    s2 = re.sub(r"(?i)^doi:\s*", "", s2)
+    s2 = re.sub(r"(?i)^https?://(?:dx\.)?doi\.org/", "", s2)
+    m = re.search(r"(10\.\d{4,9}/\S+)", s2)
+    if m:
+        return m.group(1).rstrip(" .,)];")
+    return s2.rstrip(" .,)];") if s2.startswith("10.") else None
+
+def extract_doi(rec: dict) -> str | None:
+    doi = safe_get(rec, ["pids", "doi", "identifier"])
+    if doi: 
+        return normalize_doi(doi)
+
+    md = rec.get("metadata") or {}
+
+    doi = md.get("doi")
+    if doi:
+        return normalize_doi(doi)
+
+    for key in ("identifiers", "related_identifiers", "alternate_identifiers"):
+        arr = md.get(key)
+        if isinstance(arr, list):
+            for it in arr:
+                if isinstance(it, dict):
+                    scheme = str(it.get("scheme") or it.get("type") or "").lower()
+                    ident  = it.get("identifier") or it.get("id") or it.get("value") or it.get("text")
+                    if scheme == "doi" and ident:
+                        cand = normalize_doi(ident)
+                        if cand: 
+                            return cand
+                    for v in it.values():
+                        if isinstance(v, str):
+                            cand = normalize_doi(v)
+                            if cand:
+                                return cand
+                elif isinstance(it, str):
+                    cand = normalize_doi(it)
+                    if cand:
+                        return cand
+    for v in rec.values():
+        if isinstance(v, str):
+            cand = normalize_doi(v)
+            if cand:
+                return cand
+    return None
+
+def parse_year(date_str: str | int | None) -> int | None:
+    if date_str is None:
+        return None
+    if isinstance(date_str, int):
+        return date_str
+    s = str(date_str)
+    for fmt in ("%Y-%m-%d", "%Y-%m", "%Y"):
+        try:
+            return datetime.strptime(s, fmt).year
+        except Exception:
+            pass
+    m = re.search(r"\d{4}", s)
+    return int(m.group(0)) if m else None
+
+def extract_publication_year(rec: dict, flat_year=None, fallback: bool = True) -> int | None:
+    """
+    Rok publikace z polí s datem publikace (publication_year, publication_date,
+    dates typu issued/publication). `fallback` = jinak rok libovolného data v
+    metadata.dates nebo `updated`/`created` – jen pro zobrazení, ne do dat.
+    """
+    if flat_year is not None and str(flat_year).strip() != "":
+        try:
+            return int(flat_year)
+        except Exception:
+            pass
+
+    for path in (["publication_year"],
+                 ["metadata","publication_year"],
+                 ["metadata","publication_date"],
+                 ["metadata","date"]):
+        v = safe_get(rec, path)
+        y = parse_year(v)
+        if y:
+            return y
+
+    md = rec.get("metadata") or {}
+    dates = md.get("dates")
+    if isinstance(dates, list):
+        preferred = ("issued", "publication", "published", "pub")
+        first_any = None
+        for d in dates:
+            if not isinstance(d, dict): 
+                continue
+            val = d.get("date") or d.get("value")
+            typ = str(d.get("type") or d.get("description") or "").lower()
+            y = parse_year(val) if val else None
+            if y:
+                if typ in preferred:
+                    return y
+                if first_any is None:
+                    first_any = y
+        if first_any and fallback:
+            return first_any
+
+    if not fallback:
+        return None
+    for key in ("updated","created"):
+        y = parse_year(rec.get(key))
+        if y:
+            return y
+    return None
+
+def extract_title(rec: dict) -> str | None:
+    # varianty: metadata.title, metadata.titles[0].title, titles[0].title, title
+    title = safe_get(rec, ["metadata","title"])
+    if isinstance(title, str) and title.strip():
+        return title.strip()
+
+    tarr = safe_get(rec, ["metadata","titles"])
+    if isinstance(tarr, list):
+        for t in tarr:
+            if isinstance(t, dict) and isinstance(t.get("title"), str) and t["title"].strip():
+                return t["title"].strip()
+
+    tarr2 = rec.get("titles")
+    if isinstance(tarr2, list):
+        for t in tarr2:
+            if isinstance(t, dict) and isinstance(t.get("title"), str) and t["title"].strip():
+                return t["title"].strip()
+
+    t2 = rec.get("title")
+    if isinstance(t2, str) and t2.strip():
+        return t2.strip()
+
+    return None
+
+def _collect_affils_from_person(p: dict, bag: set):
+    for key in ("affiliation", "affiliations"):
+        aff = p.get(key)
+        if isinstance(aff, list):
+            for a in aff:
+                if isinstance(a, dict):
+                    name = a.get("fullName") or a.get("name") or a.get("organization") or a.get("value")
+                    if isinstance(name, str) and name.strip():
+                        bag.add(name.strip())
+                elif isinstance(a, str) and a.strip():
+                    bag.add(a.strip())
+        elif isinstance(aff, dict):
+            name = aff.get("fullName") or aff.get("name") or aff.get("organization") or aff.get("value")
+            if isinstance(name, str) and name.strip():
+                bag.add(name.strip())
+        elif isinstance(aff, str) and aff.strip():
+            bag.add(aff.strip())
+
+def extract_affiliation_list(rec: dict) -> list[str]:
+    """Unikátní afiliace autorů a přispěvatelů, seřazené."""
+    bag = set()
+    md = rec.get("metadata") or {}
+    for key in ("creators","contributors"):
+        arr = md.get(key)
+        if isinstance(arr, list):
+            for p in arr:
+                if isinstance(p, dict):
+                    _collect_affils_from_person(p, bag)
+    return sorted(bag)
+
+def extract_affiliations(rec: dict) -> str | None:
+    bag = extract_affiliation_list(rec)
+    return "; ".join(bag) if bag else None
+
+def extract_community_ids(rec: dict) -> list[str]:
+    """Id (UUID) všech komunit záznamu z parent.communities.ids."""
+    ids = safe_get(rec, ["parent","communities","ids"]) or safe_get(rec, ["communities","ids"])
+    if not isinstance(ids, list):
+        return []
+    return [i for i in ids if isinstance(i, str) and i]
+
+def extract_community_slug(rec: dict) -> str | None:
+    # slug výchozí komunity z rozbalených entries (parent.communities.entries)
+    default = safe_get(rec, ["parent","communities","default"])
+    entries = safe_get(rec, ["parent","communities","entries"])
+    if isinstance(entries, list):
+        for e in entries:
+            if isinstance(e, dict) and (not default or e.get("id") == default):
+                slug = e.get("slug")
+                if isinstance(slug, str) and slug.strip():
+                    return slug.strip()
+    # běžné varianty v InvenioRDM
+    if isinstance(default, str) and default.strip():
+        return default.strip()
+    default2 = safe_get(rec, ["communities","default"])
+    if isinstance(default2, str) and default2.strip():
+        return default2.strip()
+    # někdy je jen single komunita v poli ids
+    ids = safe_get(rec, ["parent","communities","ids"]) or safe_get(rec, ["communities","ids"])
+    if isinstance(ids, list) and ids:
+        # první jako fallback
+        first = ids[0]
+        if isinstance(first, str) and first.strip():
+            return first.strip()
+        if isinstance(first, dict):
+            # někdy objekty se slugem/id
+            slug = first.get("slug") or first.get("id") or first.get("identifier")
+            if isinstance(slug, str) and slug.strip():
+                return slug.strip()
+    return None
+
+def extract_ui_url(detail_or_raw: dict, rid: str) -> str:
+    # 1) preferuj HTML linky z detailu
+    for k in ("self_html", "html", "landing_page", "record_html"):
+        v = safe_get(detail_or_raw, ["links", k])
+        if isinstance(v, str) and v.strip():
+            return v.rstrip("/")  # odstraníme trailing slash
+
+    # 2) fallback na kanonický tvar UI URL
+    return f"{BASE_URL}/datasets/records/{rid}".rstrip("/")
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Sdílená HTTP vrstva pro skripty nad datarepo.eosc.cz.
+
+  - get_session()   – requests.Session s poolem spojení, sdíleným limiterem a (volitelně) cache
+  - polite_get()    – GET s opakováním na 429/5xx (Retry-After, exponenciální čekání s jitterem)
+  - ResponseCache   – perzistentní cache odpovědí v SQLite (klíč = URL + hash autorizace),
+                      TTL a LRU vyřazování podle celkové velikosti
+  - NrpAdapter      – transportní adaptér: před každým síťovým dotazem si vezme slot
+                      z AdaptiveRateLimiter, posílá podmíněné dotazy
+                      (If-None-Match / If-Modified-Since) a při 304 vrátí uložené tělo
+
+Nastavení přes proměnné prostředí (používají je skripty bez vlastních přepínačů):
+  NRP_HTTP_CACHE         cesta k SQLite souboru, „off“ cache vypne (default .http_cache/http.sqlite)
+  NRP_HTTP_CACHE_TTL     kolik sekund je záznam čerstvý bez revalidace (default 0 = vždy revalidovat)
+  NRP_HTTP_CACHE_MAX_MB  strop velikosti cache (default 512)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from ratelimit import AdaptiveRateLimiter, backoff, default_limiter, parse_retry_after
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_CACHE_PATH = ROOT / ".http_cache" / "http.sqlite"
+
+# hlavičky, které po dekódování těla nedávají smysl ukládat
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+class ResponseCache:
+    def __init__(self, path, ttl: float = 0, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT, headers TEXT, body BLOB,"
+            " etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(accessed_at)")
+        self._total = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url: str, auth: str | None = None) -> str:
+        auth_hash = hashlib.sha256(auth.encode()).hexdigest()[:16] if auth else ""
+        return f"{auth_hash}|{url}"
+
+    def lookup(self, key: str):
+        """Vrátí dict se záznamem (headers, body, etag, last_modified, fresh) nebo None."""
+        with self._lock:
+            row = self._con.execute(
+                "SELECT headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._con.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._con.commit()
+        headers, body, etag, last_modified, stored_at = row
+        return {
+            "headers": json.loads(headers),
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": self.ttl > 0 and time.time() - stored_at < self.ttl,
+        }
+
+    def store(self, key: str, url: str, headers: dict, body: bytes):
+        headers = {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}
+        etag = headers.get("ETag") or headers.get("etag")
+        last_modified = headers.get("Last-Modified") or headers.get("last-modified")
+        now = time.time()
+        with self._lock:
+            old = self._con.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, json.dumps(headers), body, etag, last_modified, now, now, len(body)),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            self._evict()
+            self._con.commit()
+
+    def refresh(self, key: str):
+        """Revalidace proběhla (304) – záznam je znovu čerstvý."""
+        with self._lock:
+            now = time.time()
+            self._con.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._con.commit()
+
+    def _evict(self):
+        # LRU: mažeme nejdéle nepoužité, dokud se nevejdeme pod strop
+        while self._total > self.max_bytes:
+            rows = self._con.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                return
+            for k, size in rows:
+                self._con.execute("DELETE FROM responses WHERE key = ?", (k,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+
+def _response_from_cache(request, entry) -> requests.Response:
+    r = requests.Response()
+    r.status_code = 200
+    r.reason = "OK"
+    r.headers = CaseInsensitiveDict(entry["headers"])
+    r._content = entry["body"]
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r.url = request.url
+    r.request = request
+    r.from_cache = True
+    return r
+
+
+class NrpAdapter(HTTPAdapter):
+    """
+    HTTPAdapter, který síťové dotazy řadí přes limiter a GET odpovědi 200
+    ukládá do ResponseCache a revaliduje je. Čerstvé záznamy z cache limiter nečerpají.
+    """
+
+    def __init__(self, cache: ResponseCache | None = None, limiter: AdaptiveRateLimiter | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.limiter = limiter
+
+    def _send_network(self, request, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+        self.limiter.acquire()
+        t0 = time.monotonic()
+        try:
+            resp = super().send(request, **kwargs)
+        except requests.RequestException:
+            self.limiter.on_response(None)
+            raise
+        self.limiter.on_response(resp.status_code, time.monotonic() - t0,
+                                 parse_retry_after(resp.headers.get("Retry-After")))
+        return resp
+
+    def send(self, request, **kwargs):
+        if self.cache is None or request.method != "GET":
+            return self._send_network(request, **kwargs)
+        key = self.cache.key(request.url, request.headers.get("Authorization"))
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            if entry["fresh"]:
+                return _response_from_cache(request, entry)
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+        resp = self._send_network(request, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            self.cache.refresh(key)
+            return _response_from_cache(request, entry)
+        if resp.status_code == 200:
+            self.cache.store(key, request.url, dict(resp.headers), resp.content)
+        return resp
+
+
+def default_cache(path=None, ttl: float | None = None) -> ResponseCache | None:
+    """ResponseCache podle argumentů / proměnných prostředí; None, pokud je cache vypnutá."""
+    path = path or os.getenv("NRP_HTTP_CACHE") or DEFAULT_CACHE_PATH
+    if str(path).lower() in ("off", "0", "none", ""):
+        return None
+    if ttl is None:
+        ttl = float(os.getenv("NRP_HTTP_CACHE_TTL") or 0)
+    max_bytes = int(float(os.getenv("NRP_HTTP_CACHE_MAX_MB") or 512) * 1024 * 1024)
+    return ResponseCache(path, ttl=ttl, max_bytes=max_bytes)
+
+
+def get_session(token: str | None = None, pool_size: int = 10, cache: ResponseCache | None = None,
+                limiter: AdaptiveRateLimiter | None = None):
+    """`limiter` default = procesní default_limiter(), sdílený všemi session."""
+    s = requests.Session()
+    # jeden sdílený pool spojení pro všechna vlákna (keep-alive k jednomu hostu)
+    adapter = NrpAdapter(cache, limiter or default_limiter(), pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"Accept": "application/json"})
+    if token:
+        s.headers.update({"Authorization": f"Bearer {token}"})
+    return s
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def polite_get(s: requests.Session, url: str, params=None, retries=6, timeout=60):
+    for i in range(retries):
+        r = s.get(url, params=params, timeout=timeout)
+        if r.status_code in RETRY_STATUSES:
+            # Retry-After zároveň pozastaví sdílený limiter (ostatní vlákna nevyrazí naráz)
+            time.sleep(max(parse_retry_after(r.headers.get("Retry-After")) or 0, backoff(i)))
+            continue
+        r.raise_for_status()
+        return r
+    r.raise_for_status()
+    return r
+
+
+class AsyncClient:
+    """
+    Asynchronní obdoba get_session() + polite_get() nad httpx: jeden event loop,
+    pool keep-alive spojení (HTTP/2, pokud je nainstalované `h2`), stejná ResponseCache
+    i stejný AdaptiveRateLimiter jako synchronní cesta.
+    """
+
+    def __init__(self, token: str | None = None, max_connections: int = 100,
+                 cache: ResponseCache | None = None, limiter: AdaptiveRateLimiter | None = None):
+        try:
+            import httpx
+        except ImportError as e:
+            raise RuntimeError("The async engine needs httpx (pip install httpx[http2])") from e
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        headers = {"Accept": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(
+            headers=headers, http2=http2, timeout=60, follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._auth = headers.get("Authorization")
+        self.cache = cache
+        self.limiter = limiter or default_limiter()
+
+    async def _send(self, url: str, headers: dict):
+        wait = self.limiter.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        t0 = time.monotonic()
+        try:
+            resp = await self._client.get(url, headers=headers)
+        except self._httpx.HTTPError:
+            self.limiter.on_response(None)
+            raise
+        self.limiter.on_response(resp.status_code, time.monotonic() - t0,
+                                 parse_retry_after(resp.headers.get("Retry-After")))
+        return resp
+
+    async def get_json(self, url: str, params=None, retries: int = 6):
+        """GET → JSON s cache, podmíněnými dotazy a opakováním jako polite_get()."""
+        url = str(self._httpx.URL(url, params=params)) if params else url
+        key = self.cache.key(url, self._auth) if self.cache is not None else None
+        entry = self.cache.lookup(key) if key else None
+        if entry is not None and entry["fresh"]:
+            return json.loads(entry["body"])
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        for i in range(retries):
+            resp = await self._send(url, headers)
+            if resp.status_code in RETRY_STATUSES:
+                await asyncio.sleep(max(parse_retry_after(resp.headers.get("Retry-After")) or 0, backoff(i)))
+                continue
+            break
+        if resp.status_code == 304 and entry is not None:
+            self.cache.refresh(key)
+            return json.loads(entry["body"])
+        resp.raise_for_status()
+        if key:
+            self.cache.store(key, url, dict(resp.headers), resp.content)
+        return resp.json()
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Adaptivní omezovač rychlosti dotazů sdílený všemi vlákny/korutinami jednoho procesu.
+
+  - AdaptiveRateLimiter – token bucket (ve tvaru GCRA: každý dotaz dostane časový slot)
+                          s AIMD řízením rychlosti: po úspěchu pomalu přidává,
+                          po 429/5xx nebo pomalé odpovědi rychlost násobně sníží;
+                          `Retry-After` pozastaví všechny, kdo limiter sdílí
+  - backoff()           – exponenciální čekání s jitterem
+  - parse_retry_after() – hodnota hlavičky Retry-After v sekundách
+
+Nastavení přes proměnné prostředí (pro default_limiter()):
+  NRP_RATE      počáteční rychlost v dotazech za sekundu (default 10)
+  NRP_MAX_RATE  horní strop rychlosti (default 50)
+"""
+import datetime
+import email.utils
+import os
+import random
+import threading
+import time
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float = 10.0, min_rate: float = 0.5, max_rate: float = 50.0,
+                 burst: int = 1, increase: float = 0.5, decrease: float = 0.5, slow_latency: float = 10.0):
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = max(burst, 1)
+        self.increase = increase          # o kolik req/s přidat zhruba za každou sekundu úspěchů
+        self.decrease = decrease          # násobek rychlosti po přiškrcení
+        self.slow_latency = slow_latency  # odpověď pomalejší než tohle bereme jako přetížení
+        self._next = 0.0
+        self._blocked_until = 0.0
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Zarezervuje slot pro jeden dotaz a vrátí, kolik sekund je třeba před odesláním počkat."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now - (self.burst - 1) / self.rate, self._blocked_until)
+            self._next = slot + 1.0 / self.rate
+            return max(0.0, slot - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_response(self, status: int | None, latency: float | None = None, retry_after: float | None = None):
+        """Upraví rychlost podle výsledku dotazu (status None = síťová chyba)."""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                # všichni čekají; po uplynutí se sloty znovu řadí po 1/rate, takže nevznikne nával
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._next = max(self._next, self._blocked_until)
+            if status is None or status in THROTTLE_STATUSES or status >= 500:
+                self._slow_down(now, self.decrease)
+            elif latency is not None and latency > self.slow_latency:
+                self._slow_down(now, 0.9)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def _slow_down(self, now: float, factor: float):
+        # jedna vlna chyb z paralelních dotazů = jedno snížení, ne N snížení
+        if now < self._cooldown_until:
+            return
+        self.rate = max(self.min_rate, self.rate * factor)
+        self._cooldown_until = now + max(1.0, 1.0 / self.rate)
+
+
+def backoff(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponenciální čekání s jitterem („equal jitter“): půl pevně, půl náhodně."""
+    d = min(cap, base * (2 ** attempt))
+    return d / 2 + random.uniform(0, d / 2)
+
+
+def parse_retry_after(value) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_limiter() -> AdaptiveRateLimiter:
+    """Jeden limiter na proces, aby ho sdíleli všichni volající (i různé session)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AdaptiveRateLimiter(rate=float(os.getenv("NRP_RATE") or 10),
+                                           max_rate=float(os.getenv("NRP_MAX_RATE") or 50))
+        return _default
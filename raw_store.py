@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Komprimované, segmentované úložiště RAW hitů (náhrada za monolitické records.jsonl).
+
+Struktura adresáře (např. nrp_dump/raw/):
+  index.json         – {"format": 1, "segments": N,
+                         "records": {id: [segment, offset, length, updated], ...}}
+                       pořadí klíčů = pořadí výpisu
+  seg-000.jsonl.gz … – každý záznam je samostatný gzip člen (JSON na jednom řádku),
+                       takže jde přečíst jediný záznam seekem na offset; soubor jako celek
+                       je zároveň platný .jsonl.gz (zcat funguje)
+
+Záznam patří do segmentu podle crc32(id) a uvnitř segmentu jsou záznamy seřazené
+podle id; komprese je deterministická (mtime=0). Segment, ve kterém se nic nezměnilo,
+je proto po dalším běhu bajtově stejný a git ho nevidí jako změnu.
+
+Použití:
+  python raw_store.py import nrp_dump/records.jsonl nrp_dump/raw   – převod starého formátu
+  python raw_store.py cat nrp_dump/raw [ID ...]                    – vypíše záznamy jako JSONL
+"""
+import gzip
+import json
+import os
+import sys
+import zlib
+from pathlib import Path
+
+DEFAULT_SEGMENTS = 32
+INDEX_NAME = "index.json"
+_SPOOL_INDEX = ".spool-index.jsonl"
+
+
+def _record_id(rec: dict):
+    return rec.get("id") or rec.get("pid") or rec.get("record_id")
+
+
+def _segment_name(seg: int) -> str:
+    return f"seg-{seg:03d}.jsonl.gz"
+
+
+def encode_record(hit: dict) -> bytes:
+    return gzip.compress((json.dumps(hit, ensure_ascii=False) + "\n").encode("utf-8"), mtime=0)
+
+
+def decode_record(blob: bytes) -> dict:
+    return json.loads(gzip.decompress(blob))
+
+
+class RawStore:
+    """Čtení: index v paměti, záznamy se dočítají seekem do segmentu."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / INDEX_NAME, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.segments = index["segments"]
+        self.records = index["records"]
+
+    @staticmethod
+    def exists(path) -> bool:
+        return (Path(path) / INDEX_NAME).exists()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, rid):
+        return rid in self.records
+
+    def ids(self):
+        return list(self.records)
+
+    def updated(self, rid):
+        entry = self.records.get(rid)
+        return entry[3] if entry else None
+
+    def get_blob(self, rid) -> bytes | None:
+        entry = self.records.get(rid)
+        if entry is None:
+            return None
+        seg, offset, length = entry[:3]
+        with open(self.path / _segment_name(seg), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get(self, rid) -> dict | None:
+        blob = self.get_blob(rid)
+        return decode_record(blob) if blob is not None else None
+
+    def get_many(self, ids) -> dict:
+        """id -> záznam; čte po segmentech a vzestupných offsetech (jeden open na segment)."""
+        by_seg = {}
+        for rid in ids:
+            entry = self.records.get(rid)
+            if entry is not None:
+                by_seg.setdefault(entry[0], []).append((entry[1], entry[2], rid))
+        out = {}
+        for seg, items in sorted(by_seg.items()):
+            with open(self.path / _segment_name(seg), "rb") as f:
+                for offset, length, rid in sorted(items):
+                    f.seek(offset)
+                    out[rid] = decode_record(f.read(length))
+        return out
+
+    def __iter__(self):
+        """Všechny záznamy v pořadí výpisu (po dávkách přes get_many)."""
+        ids = self.ids()
+        for i in range(0, len(ids), 1000):
+            chunk = ids[i:i + 1000]
+            recs = self.get_many(chunk)
+            for rid in chunk:
+                yield recs[rid]
+
+
+class RawStoreWriter:
+    """
+    Zápis nové verze úložiště. Záznamy se během běhu připisují do spool souborů
+    (jeden na segment) a do spool indexu; close() je v každém segmentu seřadí podle id,
+    zapíše finální segmenty a index. Spool přežije pád – state()/resume slouží pro --resume.
+    """
+
+    def __init__(self, path, segments: int = DEFAULT_SEGMENTS, resume: dict | None = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        if resume is not None:
+            segments = resume["segments"]
+        self.segments = segments
+        self._entries = {}  # id -> [seg, spool_offset, length, updated], pořadí = pořadí přidání
+        if resume is None:
+            for p in self.path.glob(".spool-*"):
+                p.unlink()
+        else:
+            self._restore(resume)
+        self._spools = [open(self._spool_path(seg), "ab") for seg in range(segments)]
+        self._index = open(self.path / _SPOOL_INDEX, "a", encoding="utf-8")
+
+    def _spool_path(self, seg: int) -> Path:
+        return self.path / f".spool-{seg:03d}"
+
+    def _restore(self, state: dict):
+        for seg, size in enumerate(state["spools"]):
+            p = self._spool_path(seg)
+            if p.exists():
+                os.truncate(p, size)
+        p = self.path / _SPOOL_INDEX
+        os.truncate(p, state["index"])
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                rid, seg, offset, length, updated = json.loads(line)
+                self._entries.pop(rid, None)
+                self._entries[rid] = [seg, offset, length, updated]
+
+    def add(self, hit: dict):
+        self.add_blob(_record_id(hit), encode_record(hit), hit.get("updated"))
+
+    def add_blob(self, rid: str, blob: bytes, updated: str | None = None):
+        """Přidá už zkomprimovaný záznam (např. nezměněný záznam z předchozí verze)."""
+        if not rid:
+            return
+        seg = zlib.crc32(rid.encode("utf-8")) % self.segments
+        spool = self._spools[seg]
+        offset = spool.tell()
+        spool.write(blob)
+        self._entries.pop(rid, None)  # duplicitní id: platí poslední výskyt
+        self._entries[rid] = [seg, offset, len(blob), updated]
+        self._index.write(json.dumps([rid, seg, offset, len(blob), updated]) + "\n")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, rid):
+        return rid in self._entries
+
+    def flush(self):
+        for spool in self._spools:
+            spool.flush()
+        self._index.flush()
+
+    def state(self) -> dict:
+        """Velikosti spool souborů po flush() – uloží se do checkpointu."""
+        self.flush()
+        return {"segments": self.segments,
+                "spools": [spool.tell() for spool in self._spools],
+                "index": self._index.tell()}
+
+    def iter_spooled(self):
+        """Záznamy už zapsané do spoolu (v pořadí přidání) – pro obnovení po --resume."""
+        self.flush()
+        for rid, (seg, offset, length, _) in list(self._entries.items()):
+            with open(self._spool_path(seg), "rb") as f:
+                f.seek(offset)
+                yield decode_record(f.read(length))
+
+    def close(self):
+        self.flush()
+        for spool in self._spools:
+            spool.close()
+        self._index.close()
+
+        by_seg = {}
+        for rid, (seg, offset, length, _) in self._entries.items():
+            by_seg.setdefault(seg, []).append((rid, offset, length))
+        final = {}
+        for seg in range(self.segments):
+            items = sorted(by_seg.get(seg, []))
+            target = self.path / _segment_name(seg)
+            tmp = target.with_suffix(".tmp")
+            pos = 0
+            with open(self._spool_path(seg), "rb") as src, open(tmp, "wb") as dst:
+                for rid, offset, length in items:
+                    src.seek(offset)
+                    dst.write(src.read(length))
+                    final[rid] = (seg, pos, length)
+                    pos += length
+            os.replace(tmp, target)
+        # segmenty navíc (dřívější vyšší počet segmentů)
+        for p in self.path.glob("seg-*.jsonl.gz"):
+            if int(p.name[4:7]) >= self.segments:
+                p.unlink()
+
+        records = {rid: [*final[rid], e[3]] for rid, e in self._entries.items()}
+        tmp = self.path / (INDEX_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": 1, "segments": self.segments, "records": records}, f, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, self.path / INDEX_NAME)
+        for p in self.path.glob(".spool-*"):
+            p.unlink()
+
+
+def update_store(path, records, segments: int = DEFAULT_SEGMENTS) -> None:
+    """Přidá/nahradí záznamy v úložišti (ostatní se zkopírují bez překomprimace)."""
+    prev = RawStore(path) if RawStore.exists(path) else None
+    w = RawStoreWriter(path, segments=prev.segments if prev else segments)
+    replaced = {_record_id(r) for r in records}
+    if prev is not None:
+        for rid in prev.ids():
+            if rid not in replaced:
+                w.add_blob(rid, prev.get_blob(rid), prev.updated(rid))
+    for rec in records:
+        w.add(rec)
+    w.close()
+
+
+def import_jsonl(jsonl_path, store_path, segments: int = DEFAULT_SEGMENTS) -> int:
+    """Převede records.jsonl do úložiště; vrací počet záznamů."""
+    w = RawStoreWriter(store_path, segments=segments)
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                w.add(json.loads(line))
+    n = len(w)
+    w.close()
+    return n
+
+
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == "import":
+        n = import_jsonl(sys.argv[2], sys.argv[3])
+        print(f"[✓] Imported {n} records → {sys.argv[3]}", file=sys.stderr)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "cat":
+        store = RawStore(sys.argv[2])
+        recs = store.get_many(sys.argv[3:]).values() if len(sys.argv) > 3 else store
+        for rec in recs:
+            sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    else:
+        print(__doc__, file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
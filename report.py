@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Všechny reporty v jednom procesu (místo čtyř samostatných skriptů ve workflow).
+
+pandas / numpy se importují jednou (matplotlib jen tehdy, když se nějaký graf změnil),
+nrp.duckdb se obnoví jednou a data, která reporty potřebují (souhrnné tabulky z nrp_db.py
++ sloupce records_flat pro komunity), se jednou načtou do ReportData. Registrované etapy pak pracují jen nad ním:
+
+  communities  – nrp_by_community.md          (communities.py, režim local)
+  charts       – grafy velikostí a čtvrtletí   (datasets-volume-graphs.py)
+  top10        – top10_datasets_enriched_v2.*  (top10_datasets.py)
+  stats        – size_stats.md + .json         (size_stats.py)
+
+Etapy na sobě nezávisí, s --jobs N běží paralelně ve vláknech. Selhání jedné etapy
+ostatní nezastaví, jen skončíme s nenulovým kódem.
+
+Použití:
+  python report.py [--out nrp_dump] [--jobs 4] [--only charts stats]
+"""
+import argparse
+import importlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import nrp_db
+
+# skripty s pomlčkou v názvu jdou importovat jen takto
+graphs = importlib.import_module("datasets-volume-graphs")
+import communities
+import size_stats
+import top10_datasets
+
+OUT_DIR = Path("nrp_dump")
+COMMUNITIES_MD = Path("nrp_by_community.md")
+COMMUNITY_COLUMNS = ["id", "updated", "url", "community_ids"]
+
+
+class ReportData:
+    """Vše, co etapy čtou – načtené jednou ze sdíleného spojení na nrp.duckdb."""
+
+    def __init__(self, out_dir=OUT_DIR):
+        self.out_dir = Path(out_dir)
+        con = nrp_db.get_connection(self.out_dir)
+        self.size_stats = {pop: nrp_db.size_stats(pop, con) for pop in ("with_size", "positive")}
+        self.histogram = nrp_db.size_histogram(con)
+        self.cdf = nrp_db.size_cdf(con)
+        self.quarters = nrp_db.quarterly_counts(con)
+        self.top_records = nrp_db.top_records(10, con)
+        self.size_breakdown = size_stats.compute(con)
+        records = nrp_db.records(COMMUNITY_COLUMNS, con)
+        # Parquet ze starších harvestů komunity nemá → etapa communities je vezme z RAW úložiště
+        self.records = records if set(COMMUNITY_COLUMNS) <= set(records.columns) else None
+
+
+STAGES = {}
+
+
+def stage(name):
+    """Registrace etapy: fn(data: ReportData) -> None."""
+    def register(fn):
+        STAGES[name] = fn
+        return fn
+    return register
+
+
+@stage("communities")
+def communities_stage(data):
+    raw_dir = data.out_dir / "raw"
+    summary = None
+    if data.records is not None:
+        summary = communities.local_summary(communities.community_frame(data.records))
+    elif not communities.RawStore.exists(raw_dir):
+        raise RuntimeError(f"No harvested raw store at {raw_dir} – run harvest_nrp.py first")
+    # výchozí harvest → nrp_by_community.md v kořeni (čte ho workflow i build_site.py), jiný --out → do něj
+    out = COMMUNITIES_MD if data.out_dir == OUT_DIR else data.out_dir / COMMUNITIES_MD
+    communities.write_report("local", str(raw_dir), str(out), summary=summary,
+                             snapshot=data.out_dir / communities.COMMUNITIES_SNAPSHOT.name)
+
+
+@stage("charts")
+def charts_stage(data):
+    graphs.render(data.size_stats["positive"], data.histogram, data.cdf, data.quarters, data.out_dir)
+
+
+@stage("top10")
+def top10_stage(data):
+    top10_datasets.main(data.top_records, data.out_dir)
+
+
+@stage("stats")
+def stats_stage(data):
+    size_stats.write(data.size_breakdown, data.out_dir / "size_stats.md", data.out_dir / "size_stats.json")
+
+
+def run_stage(name, data):
+    """Spustí etapu; vrací (name, sekundy, výjimka nebo None)."""
+    t0 = time.monotonic()
+    try:
+        STAGES[name](data)
+    except Exception as e:
+        return name, time.monotonic() - t0, e
+    return name, time.monotonic() - t0, None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run all report stages in one process over data loaded once.")
+    ap.add_argument("--out", default=str(OUT_DIR), help="Harvest output folder (default: %(default)s)")
+    ap.add_argument("--only", nargs="+", choices=list(STAGES), default=None, help="Run only these stages")
+    ap.add_argument("--jobs", type=int, default=1, help="Stages run in parallel (default: %(default)s)")
+    args = ap.parse_args()
+
+    t0 = time.monotonic()
+    data = ReportData(args.out)
+    print(f"[i] Data loaded in {time.monotonic() - t0:.2f} s", file=sys.stderr)
+
+    names = args.only or list(STAGES)
+    if args.jobs > 1 and len(names) > 1:
+        with ThreadPoolExecutor(max_workers=min(args.jobs, len(names))) as ex:
+            results = list(ex.map(lambda n: run_stage(n, data), names))
+    else:
+        results = [run_stage(n, data) for n in names]
+
+    failed = 0
+    for name, secs, err in results:
+        if err is None:
+            print(f"[✓] {name} ({secs:.2f} s)", file=sys.stderr)
+        else:
+            failed += 1
+            print(f"[!] {name} failed: {err!r}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
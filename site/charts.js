@@ -0,0 +1,253 @@
+// Interaktivní grafy pro public/index.html – kreslí SVG z předagregovaných JSON (build_site.py):
+//   data/cells.json – počty a součty velikostí po (komunita, čtvrtletí publikace, koš velikosti)
+//   data/cdf.json   – kvantilové body CDF velikostí pro celek ("*") a pro každou komunitu
+//   data/top.json   – 10 největších záznamů celkem a v každé komunitě
+// Filtry (komunita, časový koš, rozsah velikostí) se počítají v prohlížeči, bez serveru.
+(function () {
+  "use strict";
+
+  var UNITS = ["B", "KB", "MB", "GB", "TB", "PB"];
+  var SVG = "http://www.w3.org/2000/svg";
+  var TOP = 10;
+  var W = 640, H = 300, M = { top: 12, right: 14, bottom: 58, left: 52 };
+
+  function humanBytes(n) {
+    var i = 0;
+    while (n >= 1024 && i < UNITS.length - 1) { n /= 1024; i++; }
+    return n.toLocaleString("en-US", { minimumFractionDigits: 2, maximumFractionDigits: 2 }) + " " + UNITS[i];
+  }
+
+  function el(tag, attrs, parent) {
+    var e = document.createElementNS(SVG, tag);
+    for (var k in attrs) e.setAttribute(k, attrs[k]);
+    if (parent) parent.appendChild(e);
+    return e;
+  }
+
+  function text(parent, x, y, s, attrs) {
+    var t = el("text", Object.assign({ x: x, y: y }, attrs || {}), parent);
+    t.textContent = s;
+    return t;
+  }
+
+  function niceMax(v) {
+    if (v <= 0) return 1;
+    var p = Math.pow(10, Math.floor(Math.log10(v)));
+    var steps = [1, 2, 2.5, 5, 10];
+    for (var i = 0; i < steps.length; i++) if (steps[i] * p >= v) return steps[i] * p;
+    return 10 * p;
+  }
+
+  // osy: x v „koších“ (log měřítko), značky na hranicích jednotek; y lineárně od 0
+  function frame(container, xDomain, yMax, xTicks, yFormat) {
+    container.textContent = "";
+    var svg = el("svg", { viewBox: "0 0 " + W + " " + H, role: "img" }, container);
+    var iw = W - M.left - M.right, ih = H - M.top - M.bottom;
+    var sx = function (v) { return M.left + (v - xDomain[0]) / (xDomain[1] - xDomain[0] || 1) * iw; };
+    var sy = function (v) { return M.top + ih - v / yMax * ih; };
+    for (var i = 0; i <= 4; i++) {
+      var v = yMax * i / 4, y = sy(v);
+      el("line", { x1: M.left, x2: M.left + iw, y1: y, y2: y, class: "grid" }, svg);
+      text(svg, M.left - 6, y + 4, yFormat(v), { "text-anchor": "end", class: "tick" });
+    }
+    xTicks.forEach(function (t) {
+      var x = sx(t.at);
+      el("line", { x1: x, x2: x, y1: M.top + ih, y2: M.top + ih + 4, class: "axis" }, svg);
+      var lbl = text(svg, x, M.top + ih + 16, t.label, { "text-anchor": t.rotate ? "end" : "middle", class: "tick" });
+      if (t.rotate) lbl.setAttribute("transform", "rotate(-45 " + x + " " + (M.top + ih + 16) + ")");
+    });
+    el("line", { x1: M.left, x2: M.left + iw, y1: M.top + ih, y2: M.top + ih, class: "axis" }, svg);
+    return { svg: svg, sx: sx, sy: sy };
+  }
+
+  function App(cells, cdf, top) {
+    this.cells = cells;
+    this.cdf = cdf;
+    this.top = top;
+    this.perUnit = cells.bins_per_unit;
+    var bins = cells.cells.filter(function (c) { return c[2] !== null && c[2] >= 0; }).map(function (c) { return c[2]; });
+    this.unitMin = bins.length ? Math.floor(Math.min.apply(null, bins) / this.perUnit) : 0;
+    this.unitMax = bins.length ? Math.ceil((Math.max.apply(null, bins) + 1) / this.perUnit) : 1;
+  }
+
+  // poloha velikosti na ose x (v koších): log_1024(bytes) * perUnit
+  App.prototype.pos = function (bytes) {
+    return Math.log2(bytes) / 10 * this.perUnit;
+  };
+
+  App.prototype.state = function () {
+    var root = this.root;
+    return {
+      community: root.querySelector("[name=community]").value,
+      bucket: root.querySelector("[name=bucket]").value,
+      lo: +root.querySelector("[name=lo]").value,
+      hi: +root.querySelector("[name=hi]").value
+    };
+  };
+
+  App.prototype.selected = function (st) {
+    var ci = st.community === "*" ? null : this.cells.communities.indexOf(st.community);
+    var full = st.lo <= this.unitMin && st.hi >= this.unitMax;
+    var lo = st.lo * this.perUnit, hi = st.hi * this.perUnit;
+    return this.cells.cells.filter(function (c) {
+      if (ci !== null && c[0] !== ci) return false;
+      if (full) return true;  // bez zúžení rozsahu počítáme i záznamy s neznámou / nulovou velikostí
+      return c[2] !== null && c[2] >= lo && c[2] < hi;
+    });
+  };
+
+  App.prototype.unitTicks = function (lo, hi) {
+    var ticks = [];
+    for (var u = lo; u <= hi; u++) ticks.push({ at: u * this.perUnit, label: "1 " + UNITS[Math.min(u, UNITS.length - 1)] });
+    return ticks;
+  };
+
+  App.prototype.drawHistogram = function (rows, st) {
+    var counts = {}, x0 = st.lo * this.perUnit, x1 = st.hi * this.perUnit;
+    rows.forEach(function (c) { if (c[2] !== null && c[2] >= 0) counts[c[2]] = (counts[c[2]] || 0) + c[3]; });
+    var yMax = niceMax(Math.max.apply(null, [4].concat(Object.keys(counts).map(function (k) { return counts[k]; }))));
+    var f = frame(this.root.querySelector(".hist"), [x0, x1], yMax, this.unitTicks(st.lo, st.hi), function (v) { return v.toFixed(0); });
+    var self = this;
+    Object.keys(counts).forEach(function (k) {
+      k = +k;
+      if (k < x0 || k >= x1) return;
+      var r = el("rect", { x: f.sx(k) + 0.5, y: f.sy(counts[k]), width: Math.max(f.sx(k + 1) - f.sx(k) - 1, 1),
+                           height: f.sy(0) - f.sy(counts[k]), class: "bar" }, f.svg);
+      el("title", {}, r).textContent = humanBytes(Math.pow(1024, k / self.perUnit)) + " – " +
+        humanBytes(Math.pow(1024, (k + 1) / self.perUnit)) + ": " + counts[k];
+    });
+  };
+
+  App.prototype.drawCdf = function (st) {
+    var pts = this.cdf[st.community] || [];
+    var x0 = st.lo * this.perUnit, x1 = st.hi * this.perUnit, self = this;
+    var f = frame(this.root.querySelector(".cdf"), [x0, x1], 1, this.unitTicks(st.lo, st.hi), function (v) { return v.toFixed(2); });
+    var clip = el("clipPath", { id: "cdf-clip" }, f.svg);
+    el("rect", { x: M.left, y: 0, width: W - M.left - M.right, height: H }, clip);
+    var d = pts.map(function (p, i) { return (i ? "L" : "M") + f.sx(self.pos(p[1])).toFixed(1) + "," + f.sy(p[0]).toFixed(1); }).join("");
+    if (d) el("path", { d: d, class: "line", "clip-path": "url(#cdf-clip)" }, f.svg);
+    var median = pts.filter(function (p) { return p[0] >= 0.5; })[0];
+    if (median) {
+      var x = f.sx(this.pos(median[1]));
+      if (x >= M.left && x <= W - M.right) {
+        el("line", { x1: x, x2: x, y1: M.top, y2: f.sy(0), class: "median" }, f.svg);
+        text(f.svg, x + 4, f.sy(0.03), "median " + humanBytes(median[1]), { class: "median-label" });
+      }
+    }
+  };
+
+  App.prototype.drawTime = function (rows, st) {
+    var counts = {}, byYear = st.bucket === "year";
+    rows.forEach(function (c) {
+      if (c[1] === null) return;
+      var k = byYear ? Math.floor(c[1] / 4) : c[1];
+      counts[k] = (counts[k] || 0) + c[3];
+    });
+    var keys = Object.keys(counts).map(Number);
+    var container = this.root.querySelector(".time");
+    if (!keys.length) { container.textContent = "No records with a publication date in this selection."; return; }
+    var k0 = Math.min.apply(null, keys), k1 = Math.max.apply(null, keys), n = k1 - k0 + 1;
+    var label = function (k) { return byYear ? String(k) : Math.floor(k / 4) + " Q" + (k % 4 + 1); };
+    var every = Math.max(1, Math.ceil(n / 24)), ticks = [];
+    for (var k = k0; k <= k1; k++) if ((k - k0) % every === 0) ticks.push({ at: k - k0 + 0.5, label: label(k), rotate: true });
+    var yMax = niceMax(Math.max.apply(null, [4].concat(keys.map(function (k) { return counts[k]; }))));
+    var f = frame(container, [0, n], yMax, ticks, function (v) { return v.toFixed(0); });
+    for (k = k0; k <= k1; k++) {
+      var v = counts[k] || 0, x = f.sx(k - k0), w = f.sx(k - k0 + 1) - x;
+      if (!v) continue;
+      var r = el("rect", { x: x + w * 0.1, y: f.sy(v), width: w * 0.8, height: f.sy(0) - f.sy(v), class: "bar" }, f.svg);
+      el("title", {}, r).textContent = label(k) + ": " + v;
+    }
+  };
+
+  // top.json má 10 největších v každé jednotce velikosti → sloučené a seřazené dají 10 největších v rozsahu
+  App.prototype.drawTop = function (st) {
+    var lo = Math.pow(1024, st.lo), hi = Math.pow(1024, st.hi);
+    var full = st.lo <= this.unitMin && st.hi >= this.unitMax;
+    var rows = (this.top[st.community] || [])
+      .filter(function (r) { return full || (r[2] >= lo && r[2] < hi); })
+      .slice(0, TOP);
+    var tbody = this.root.querySelector(".top tbody");
+    tbody.textContent = "";
+    rows.forEach(function (r, i) {
+      var tr = document.createElement("tr");
+      [String(i + 1), null, humanBytes(r[2]), r[3] === null ? "" : String(r[3])].forEach(function (v, j) {
+        var td = document.createElement("td");
+        if (j === 1) {
+          var a = document.createElement("a");
+          a.href = r[4] || "#";
+          a.textContent = r[1] || r[0];
+          td.appendChild(a);
+        } else {
+          td.textContent = v;
+        }
+        tr.appendChild(td);
+      });
+      tbody.appendChild(tr);
+    });
+  };
+
+  App.prototype.update = function () {
+    var st = this.state();
+    if (st.hi <= st.lo) st.hi = st.lo + 1;
+    var rows = this.selected(st);
+    var n = 0, bytes = 0;
+    rows.forEach(function (c) { n += c[3]; bytes += c[4]; });
+    this.root.querySelector(".summary").textContent =
+      n.toLocaleString("en-US") + " records · " + humanBytes(bytes) + " in total";
+    this.drawHistogram(rows, st);
+    this.drawCdf(st);
+    this.drawTime(rows, st);
+    this.drawTop(st);
+  };
+
+  App.prototype.mount = function (root) {
+    this.root = root;
+    var sel = root.querySelector("[name=community]"), self = this;
+    var totals = {};
+    this.cells.cells.forEach(function (c) { totals[c[0]] = (totals[c[0]] || 0) + c[3]; });
+    this.cells.communities
+      .map(function (name, i) { return { name: name, n: totals[i] || 0 }; })
+      .sort(function (a, b) { return b.n - a.n; })
+      .forEach(function (c) {
+        var o = document.createElement("option");
+        o.value = c.name;
+        o.textContent = (c.name || "No community") + " (" + c.n + ")";
+        sel.appendChild(o);
+      });
+    ["lo", "hi"].forEach(function (name) {
+      var s = root.querySelector("[name=" + name + "]");
+      for (var u = self.unitMin; u <= self.unitMax; u++) {
+        var o = document.createElement("option");
+        o.value = u;
+        o.textContent = "1 " + UNITS[Math.min(u, UNITS.length - 1)];
+        s.appendChild(o);
+      }
+      s.value = name === "lo" ? self.unitMin : self.unitMax;
+    });
+    root.querySelectorAll("select").forEach(function (s) { s.addEventListener("change", function () { self.update(); }); });
+    root.hidden = false;
+    this.update();
+  };
+
+  function load(url) {
+    return fetch(url).then(function (r) {
+      if (!r.ok) throw new Error(url + ": " + r.status);
+      return r.json();
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var root = document.getElementById("explorer");
+    if (!root) return;
+    if (!window.fetch) { document.documentElement.classList.remove("js"); return; }
+    var base = root.getAttribute("data-src");
+    Promise.all([load(base + "cells.json"), load(base + "cdf.json"), load(base + "top.json")])
+      .then(function (d) { new App(d[0], d[1], d[2]).mount(root); })
+      .catch(function (e) {
+        // bez dat zobrazíme statické PNG (skryté třídou "js"), interaktivní část zůstane skrytá
+        document.documentElement.classList.remove("js");
+        console.error(e);
+      });
+  });
+})();
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Slučitelný kvantilový sketch velikostí záznamů (nrp_dump/size_sketch.json).
+
+Logaritmické koše jako DDSketch: hodnota x > 0 padne do koše ceil(log_γ x),
+γ = (1 + α) / (1 − α), takže každý odhad kvantilu má relativní chybu nejvýš α
+(default 1 %). Nuly mají vlastní počítadlo. Počet a součet se drží přesně, min a max také
+(jen po odebrání krajní hodnoty už s přesností α).
+
+  - add / remove   – přidání i odebrání hodnoty (změněný nebo smazaný záznam)
+  - merge          – sečtení košů dvou sketchů se stejným α (shardy, různé běhy)
+  - quantile       – odhad kvantilu bez řazení a bez čtení dat
+
+Harvester sketch udržuje průběžně: při plném běhu ho staví z proudu řádků,
+při --incremental vezme předchozí soubor a jen odečte staré a přičte nové velikosti.
+
+Použití:
+  python size_sketch.py show nrp_dump/size_sketch.json            – počet a kvantily
+  python size_sketch.py merge OUT.json A.json B.json [...]         – sloučení sketchů
+"""
+import json
+import math
+import os
+import sys
+
+FORMAT = 1
+DEFAULT_ACCURACY = 0.01
+SKETCH_NAME = "size_sketch.json"
+
+
+class SizeSketch:
+    def __init__(self, relative_accuracy: float = DEFAULT_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = {}  # index koše -> počet
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, x) -> int:
+        return math.ceil(math.log(x) / self._log_gamma)
+
+    def _value(self, i: int) -> float:
+        # střed koše (γ^(i-1), γ^i] s relativní chybou nejvýš α
+        return 2 * self._gamma ** i / (self._gamma + 1)
+
+    def add(self, x, n: int = 1):
+        if x is None:
+            return
+        if x < 0:
+            raise ValueError(f"negative size: {x}")
+        if x == 0:
+            self.zero_count += n
+        else:
+            i = self._index(x)
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.count += n
+        self.sum += x * n
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+    def remove(self, x, n: int = 1):
+        """Odebere dříve přidanou hodnotu (změněný / smazaný záznam)."""
+        if x is None:
+            return
+        if x == 0:
+            if self.zero_count < n:
+                raise ValueError("removing a value that is not in the sketch")
+            self.zero_count -= n
+        else:
+            i = self._index(x)
+            left = self.bins.get(i, 0) - n
+            if left < 0:
+                raise ValueError("removing a value that is not in the sketch")
+            if left:
+                self.bins[i] = left
+            else:
+                del self.bins[i]
+        self.count -= n
+        self.sum -= x * n
+        if x == self.min or x == self.max:
+            self._bounds_from_bins()
+
+    def _bounds_from_bins(self):
+        if self.count == 0:
+            self.min = self.max = None
+            return
+        self.min = 0 if self.zero_count else self._value(min(self.bins))
+        self.max = self._value(max(self.bins)) if self.bins else 0
+
+    def merge(self, other: "SizeSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        for attr, pick in (("min", min), ("max", max)):
+            a, b = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, b if a is None else a if b is None else pick(a, b))
+        return self
+
+    def quantile(self, q: float, positive: bool = False):
+        """
+        Odhad q-kvantilu (0 ≤ q ≤ 1) s relativní chybou nejvýš α; None pro prázdný sketch.
+        `positive` = jen kladné hodnoty (bez nul), jako populace 'positive' v nrp_db.
+        """
+        zeros = 0 if positive else self.zero_count
+        n = self.count - self.zero_count + zeros
+        if n <= 0:
+            return None
+        rank = q * (n - 1)
+        if rank < zeros:
+            return 0
+        seen = zeros
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen > rank:
+                v = self._value(i)
+                # krajní koše neodhadujeme za hranici přesně známého min/max
+                return min(max(v, self.min), self.max) if self.min is not None else v
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {"format": FORMAT, "relative_accuracy": self.relative_accuracy,
+                "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "zero_count": self.zero_count,
+                "bins": {str(i): self.bins[i] for i in sorted(self.bins)}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SizeSketch":
+        if d.get("format") != FORMAT:
+            raise ValueError(f"unsupported sketch format: {d.get('format')}")
+        sk = cls(d["relative_accuracy"])
+        sk.bins = {int(i): n for i, n in d["bins"].items()}
+        sk.zero_count = d["zero_count"]
+        sk.count = d["count"]
+        sk.sum = d["sum"]
+        sk.min = d["min"]
+        sk.max = d["max"]
+        return sk
+
+
+def load_sketch(path) -> SizeSketch | None:
+    """Sketch ze souboru; None, pokud soubor chybí nebo je nečitelný."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return SizeSketch.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.exists(path):
+            print(f"[!] Ignoring unreadable sketch {path}: {e}", file=sys.stderr)
+        return None
+
+
+def save_sketch(sketch: SizeSketch, path):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sketch.to_dict(), f, indent=1)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "show":
+        sk = load_sketch(sys.argv[2])
+        if sk is None:
+            sys.exit(f"[!] No sketch at {sys.argv[2]}")
+        print(f"count: {sk.count:,} (zero: {sk.zero_count:,})  sum: {sk.sum:,}  min: {sk.min}  max: {sk.max}")
+        for q in (0.5, 0.9, 0.99):
+            v = sk.quantile(q)
+            print(f"p{round(q * 100)}: {v:,.0f}" if v is not None else f"p{round(q * 100)}: NA")
+    elif len(sys.argv) >= 4 and sys.argv[1] == "merge":
+        merged = None
+        for path in sys.argv[3:]:
+            sk = load_sketch(path)
+            if sk is None:
+                sys.exit(f"[!] No sketch at {path}")
+            merged = sk if merged is None else merged.merge(sk)
+        save_sketch(merged, sys.argv[2])
+        print(f"[✓] Merged {len(sys.argv) - 3} sketches → {sys.argv[2]} ({merged.count:,} values)", file=sys.stderr)
+    else:
+        print(__doc__, file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
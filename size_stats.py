@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Statistiky velikostí záznamů – celkově i po skupinách, jedním průchodem (size_stats.md + .json).
+
+Jediný dotaz nad records_flat v nrp.duckdb (GROUP BY GROUPING SETS) spočte pro celý
+katalog i pro každou hodnotu každého seskupení: počet, součet, min, max, průměr,
+rozptyl, zvolené kvantily a počty v logaritmických koších velikostí.
+Populace = záznamy se známou velikostí (bytes_total není null), jako v size_stats.
+
+Seskupení: community, publication_year, access_status, files (počet souborů v koších).
+
+Použití:
+  python size_stats.py [--out-md nrp_dump/size_stats.md] [--out-json nrp_dump/size_stats.json]
+                       [--group-by community files] [--quantiles 0.5 0.9 0.99]
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+import nrp_db
+from topk import human_bytes
+
+OUT_DIR = Path("nrp_dump")
+QUANTILES = (0.5, 0.9, 0.99)
+UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
+
+# seskupení -> (SQL výraz, sloupce records_flat, které potřebuje)
+FILES_BUCKETS = ["0", "1", "2–9", "10–99", "100–999", "1000+"]
+GROUPS = {
+    "community": ("community", ["community"]),
+    "publication_year": ("publication_year", ["publication_year"]),
+    "access_status": ("access_status", ["access_status"]),
+    "files": ("CASE WHEN files_count IS NULL THEN NULL WHEN files_count = 0 THEN '0' "
+              "WHEN files_count = 1 THEN '1' WHEN files_count < 10 THEN '2–9' "
+              "WHEN files_count < 100 THEN '10–99' WHEN files_count < 1000 THEN '100–999' ELSE '1000+' END",
+              ["files_count"]),
+}
+GROUP_TITLES = {"community": "Community", "publication_year": "Publication year",
+                "access_status": "Access status", "files": "Files per record"}
+
+# koš velikosti: 1–10, 10–100, 100–1024 v každé jednotce (B, KB, MB, …), nuly = -1
+_BUCKET = ("CASE WHEN b = 0 THEN -1 ELSE "
+           "floor(log2(b) / 10)::INTEGER * 3 + "
+           "CASE WHEN b / pow(1024, floor(log2(b) / 10)) < 10 THEN 0 "
+           "WHEN b / pow(1024, floor(log2(b) / 10)) < 100 THEN 1 ELSE 2 END END")
+
+
+def bucket_label(k: int) -> str:
+    if k < 0:
+        return "0 B"
+    unit, step = divmod(k, 3)
+    lo = f"{10 ** step} {UNITS[unit]}"
+    hi = f"1 {UNITS[unit + 1]}" if step == 2 and unit + 1 < len(UNITS) else f"{10 ** (step + 1)} {UNITS[unit]}"
+    return f"{lo} – {hi}"
+
+
+def _qname(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def _entry(row, quantiles) -> dict:
+    n, total, lo, hi, mean, var, qs, hist = row
+    return {
+        "count": n, "sum": int(total or 0), "min": lo, "max": hi, "mean": mean, "variance": var,
+        "quantiles": {_qname(q): v for q, v in zip(quantiles, qs)},
+        "buckets": {bucket_label(k): hist[k] for k in sorted(hist)},
+    }
+
+
+def compute(con=None, group_by=tuple(GROUPS), quantiles=QUANTILES) -> dict:
+    """Celkové a skupinové statistiky jedním dotazem; seskupení bez sloupců v Parquetu se vynechají."""
+    con = con or nrp_db.get_connection()
+    available = set(nrp_db.columns(con, "records_flat"))
+    groups = [g for g in group_by if set(GROUPS[g][1]) <= available]
+    dims = ", ".join(f"{GROUPS[g][0]} AS g_{g}" for g in groups)
+    flags = "".join(f", GROUPING(g_{g}) AS f_{g}, g_{g}" for g in groups)
+    sets = ", ".join(["()"] + [f"(g_{g})" for g in groups])
+    qlist = "[" + ", ".join(str(float(q)) for q in quantiles) + "]"
+    rows = con.execute(f"""
+        WITH s AS (SELECT {nrp_db.BYTES} AS b{', ' + dims if dims else ''} FROM records_flat),
+        t AS (SELECT *, {_BUCKET} AS bucket FROM s WHERE b IS NOT NULL)
+        SELECT count(*), sum(b), min(b), max(b), avg(b), var_samp(b), quantile_cont(b, {qlist}),
+               histogram(bucket){flags}
+        FROM t
+        GROUP BY GROUPING SETS ({sets})
+    """).fetchall()
+
+    out = {"population": "records with bytes_total", "quantiles": [_qname(q) for q in quantiles],
+           "overall": None, "groups": {g: [] for g in groups}}
+    for row in rows:
+        base, rest = row[:8], row[8:]
+        grouped = [(g, rest[2 * i + 1]) for i, g in enumerate(groups) if rest[2 * i] == 0]
+        entry = _entry(base, quantiles)
+        if not grouped:
+            out["overall"] = entry
+        else:
+            g, key = grouped[0]
+            out["groups"][g].append({"key": key, **entry})
+    for g, entries in out["groups"].items():
+        entries.sort(key=_sort_key(g))
+    return out
+
+
+def _sort_key(group: str):
+    if group == "files":
+        return lambda e: (e["key"] is None, FILES_BUCKETS.index(e["key"]) if e["key"] in FILES_BUCKETS else 0)
+    if group == "community":
+        return lambda e: (e["key"] is None, -e["count"], e["key"] or "")
+    return lambda e: (e["key"] is None, e["key"] if e["key"] is not None else 0)
+
+
+def _fmt(v) -> str:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "—"
+    return human_bytes(v)
+
+
+def to_markdown(stats: dict) -> str:
+    o = stats["overall"]
+    if o is None or not o["count"]:
+        return "## Record Size Statistics\n\n- **Records with size:** 0\n"
+    total, mean, median = o["sum"], o["mean"], o["quantiles"].get("p50")
+    lines = [
+        "## Record Size Statistics\n",
+        f"- **Records with size:** {o['count']:,}",
+        f"- **Total volume:** {_fmt(total)} ({total:,.0f} B)",
+        f"- **Mean:** {_fmt(mean)} ({mean:,.0f} B)",
+    ]
+    if median is not None:
+        lines.append(f"- **Median:** {_fmt(median)} ({median:,.0f} B)")
+    std = math.sqrt(o["variance"]) if o["variance"] is not None else None
+    lines.append(f"- **Std. deviation:** {_fmt(std)}")
+    lines.append(f"- **Min / Max:** {_fmt(o['min'])} / {_fmt(o['max'])}")
+    lines.append("- **Percentiles:** " + " · ".join(f"{k} {_fmt(v)}" for k, v in o["quantiles"].items()))
+
+    lines += ["", "### Size distribution", "", "| Size | Records |", "|---|---:|"]
+    lines += [f"| {label} | {n:,} |" for label, n in o["buckets"].items()]
+
+    qs = stats["quantiles"]
+    for g, entries in stats["groups"].items():
+        if not entries:
+            continue
+        head = [GROUP_TITLES[g], "Records", "Total", "Mean", *qs, "Max"]
+        lines += ["", f"### By {GROUP_TITLES[g].lower()}", "",
+                  "| " + " | ".join(head) + " |", "|---|" + "---:|" * (len(head) - 1)]
+        for e in entries:
+            key = "—" if e["key"] is None else str(e["key"])
+            cells = [key, f"{e['count']:,}", _fmt(e["sum"]), _fmt(e["mean"]),
+                     *(_fmt(e["quantiles"][q]) for q in qs), _fmt(e["max"])]
+            lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def write(stats: dict, md_path=OUT_DIR / "size_stats.md", json_path=OUT_DIR / "size_stats.json"):
+    Path(md_path).write_text(to_markdown(stats), encoding="utf-8")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    print(f"[✓] Written: {md_path}, {json_path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Record size statistics, overall and per group, in one pass.")
+    ap.add_argument("--out-md", default=str(OUT_DIR / "size_stats.md"))
+    ap.add_argument("--out-json", default=str(OUT_DIR / "size_stats.json"))
+    ap.add_argument("--group-by", nargs="*", choices=list(GROUPS), default=list(GROUPS),
+                    help="Breakdowns to include (default: all)")
+    ap.add_argument("--quantiles", nargs="+", type=float, default=list(QUANTILES))
+    args = ap.parse_args()
+    if any(not 0 <= q <= 1 for q in args.quantiles):
+        ap.error("quantiles must be between 0 and 1")
+    write(compute(group_by=args.group_by, quantiles=args.quantiles), args.out_md, args.out_json)
+
+
+if __name__ == "__main__":
+    main()
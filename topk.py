@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""TOP-K žebříčky nad nrp_dump/records_flat.parquet.
+
+Z Parquetu se čtou jen sloupce, které metrika / seskupení / filtry potřebují,
+a výběr je částečný (nlargest = halda velikosti K), ne řazení celé tabulky –
+i „TOP-K pro každou skupinu“ zůstává levné s rostoucím počtem záznamů a skupin.
+
+Příklady:
+  python topk.py                                   – 10 největších podle bytes_total
+  python topk.py -k 5 --metric files_count --group-by publication_year
+  python topk.py --metric bytes_per_file --min-year 2020 --access-status open --format csv
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from nrp_extract import extract_community_slug
+from raw_store import RawStore
+
+OUT_DIR = Path("nrp_dump")
+PARQUET = OUT_DIR / "records_flat.parquet"
+RAW_DIR = OUT_DIR / "raw"
+
+# metrika -> sloupce Parquetu, ze kterých se počítá
+METRICS = {
+    "bytes_total": ["bytes_total"],
+    "files_count": ["files_count"],
+    "bytes_per_file": ["bytes_total", "files_count"],
+}
+GROUP_BY = ("community", "publication_year")
+
+
+def attach_communities(df: pd.DataFrame, raw_dir=RAW_DIR) -> pd.DataFrame:
+    """Doplní sloupec `community` z RAW úložiště (Parquet ze starších harvestů ho nemá)."""
+    raw = RawStore(raw_dir).get_many(df["id"].tolist())
+    df = df.copy()
+    df["community"] = [extract_community_slug(raw[rid]) if rid in raw else None for rid in df["id"]]
+    return df
+
+
+def load_frame(parquet=PARQUET, metric: str = "bytes_total", group_by: str | None = None,
+               extra_columns=(), min_year: int | None = None, max_year: int | None = None,
+               access_status: str | None = None, community: str | None = None,
+               raw_dir=RAW_DIR) -> pd.DataFrame:
+    """
+    Načte z Parquetu jen potřebné sloupce, použije filtry a dopočte sloupec metriky.
+    Řádky bez hodnoty metriky vypadnou.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    cols = ["id", *METRICS[metric], *extra_columns]
+    if group_by == "publication_year" or min_year is not None or max_year is not None:
+        cols.append("publication_year")
+    if access_status is not None:
+        cols.append("access_status")
+    if group_by == "community" or community is not None:
+        cols.append("community")
+    available = set(pq.read_schema(parquet).names)
+    cols = [c for c in dict.fromkeys(cols) if c in available]
+    df = pq.read_table(parquet, columns=cols).to_pandas()
+
+    # starší Parquet má čísla jako text – převedeme až tady, po výběru sloupců
+    for c in ("bytes_total", "files_count", "publication_year"):
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+
+    if min_year is not None:
+        df = df[df["publication_year"] >= min_year]
+    if max_year is not None:
+        df = df[df["publication_year"] <= max_year]
+    if access_status is not None:
+        df = df[df["access_status"].astype("string") == access_status]
+
+    if metric == "bytes_per_file":
+        files = df["files_count"].where(df["files_count"] > 0)
+        df = df.assign(bytes_per_file=df["bytes_total"] / files)
+    df = df.dropna(subset=[metric])
+
+    if group_by == "community" or community is not None:
+        if "community" not in df.columns:
+            df = attach_communities(df, raw_dir)
+        else:
+            df["community"] = df["community"].astype("string")
+        if community is not None:
+            df = df[df["community"] == community]
+    return df
+
+
+def top_k(df: pd.DataFrame, k: int, metric: str = "bytes_total", group_by: str | None = None) -> pd.DataFrame:
+    """K největších podle `metric` (celkově nebo v každé skupině), seřazené sestupně."""
+    if group_by is None:
+        return df.nlargest(k, metric)
+    df = df.dropna(subset=[group_by])
+    idx = df.groupby(group_by, sort=False)[metric].nlargest(k).index.get_level_values(-1)
+    out = df.loc[idx]
+    return out.sort_values([group_by, metric], ascending=[True, False], kind="stable")
+
+
+def human_bytes(n):
+    units = ["B", "KB", "MB", "GB", "TB", "PB"]
+    i = 0
+    f = float(n)
+    while f >= 1024 and i < len(units) - 1:
+        f /= 1024.0
+        i += 1
+    return f"{f:,.2f} {units[i]}"
+
+
+def to_markdown(df: pd.DataFrame, metric: str, group_by: str | None = None) -> str:
+    head = ([group_by] if group_by else []) + ["#", "id", metric]
+    lines = ["| " + " | ".join(head) + " |", "|" + "|".join("---:" if h in ("#", metric) else "---" for h in head) + "|"]
+    rank, prev = 0, object()
+    for _, r in df.iterrows():
+        g = r[group_by] if group_by else None
+        rank = rank + 1 if g == prev else 1
+        prev = g
+        v = r[metric]
+        val = human_bytes(v) if metric in ("bytes_total", "bytes_per_file") else f"{int(v):,}"
+        cells = ([str(int(g)) if group_by == "publication_year" else str(g)] if group_by else []) + [str(rank), r["id"], val]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Top-K datasets from the harvested Parquet.")
+    ap.add_argument("-k", type=int, default=10, help="How many records (per group) to keep")
+    ap.add_argument("--metric", choices=sorted(METRICS), default="bytes_total")
+    ap.add_argument("--group-by", choices=GROUP_BY, default=None, help="Rank within each group")
+    ap.add_argument("--parquet", default=str(PARQUET))
+    ap.add_argument("--raw", default=str(RAW_DIR), help="Raw store (for community lookups)")
+    ap.add_argument("--min-year", type=int, default=None, help="Filter: publication_year >= this")
+    ap.add_argument("--max-year", type=int, default=None, help="Filter: publication_year <= this")
+    ap.add_argument("--access-status", default=None, help="Filter: access_status (e.g. open)")
+    ap.add_argument("--community", default=None, help="Filter: community slug")
+    ap.add_argument("--format", choices=("md", "csv", "json"), default="md")
+    ap.add_argument("--out", default=None, help="Output file (default stdout)")
+    args = ap.parse_args()
+
+    df = load_frame(args.parquet, args.metric, args.group_by, min_year=args.min_year, max_year=args.max_year,
+                    access_status=args.access_status, community=args.community, raw_dir=args.raw)
+    res = top_k(df, args.k, args.metric, args.group_by)
+    print(f"[i] {len(res)} of {len(df)} records", file=sys.stderr)
+
+    if args.format == "csv":
+        text = res.to_csv(index=False)
+    elif args.format == "json":
+        text = json.dumps(json.loads(res.to_json(orient="records", date_format="iso")), ensure_ascii=False, indent=2) + "\n"
+    else:
+        text = to_markdown(res, args.metric, args.group_by)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+        print(f"[✓] Written: {args.out}", file=sys.stderr)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()